@@ -0,0 +1,64 @@
+"""
+Take, list and restore backups of the points database.
+
+The bot takes backups on its own every BACKUP_INTERVAL seconds; this is for
+doing it by hand. "now" is safe while the bot runs. "restore" is not: stop
+the bot first. Restoring moves the current database aside rather than
+deleting it.
+
+    python backup.py list
+    python backup.py now
+    python backup.py restore --at "2024-06-01 12:00"
+"""
+import argparse
+import calendar
+import sys
+import time
+
+from config import DATABASE_PATH
+from functions.backup import backup_database, backup_path, find_backup, list_backups, restore_backup
+from functions.database import BACKUP_DIR, BACKUP_STEP_PAGES, BACKUP_STEP_SLEEP
+
+
+def parse_time(value: str) -> float:
+    """A UTC time like 2024-06-01 or 2024-06-01 12:00[:00]"""
+    for pattern in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return calendar.timegm(time.strptime(value, pattern))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"not a time: {value}")
+
+
+def format_time(taken: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(taken))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Back up or restore the database")
+    parser.add_argument("--database", default=DATABASE_PATH, help="the live database")
+    parser.add_argument("--directory", default=BACKUP_DIR, help="where backups are kept")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="show every backup")
+    commands.add_parser("now", help="take a backup now")
+    restore = commands.add_parser("restore", help="replace the database with a backup (stop the bot first)")
+    restore.add_argument("path", nargs="?", help="a backup file; defaults to the newest")
+    restore.add_argument("--at", type=parse_time, help="use the newest backup taken at or before this UTC time")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for taken, path in list_backups(args.database, args.directory):
+            print(f"{format_time(taken)}  {path}")
+
+    elif args.command == "now":
+        started = time.perf_counter()
+        path = backup_path(args.database, args.directory, time.time())
+        pages = backup_database(args.database, path, BACKUP_STEP_PAGES, BACKUP_STEP_SLEEP)
+        print(f"🟩 | Backed up {pages:,} pages to {path} in {time.perf_counter() - started:.1f}s")
+
+    else:
+        path = args.path or find_backup(args.database, args.directory, args.at)
+        if path is None:
+            sys.exit("🟥 | No backup found")
+        aside = restore_backup(path, args.database)
+        print(f"🟩 | Restored {path}; the previous database was moved to {aside}")
@@ -9,9 +9,13 @@ from functions.database import (
     set_losses,
     adjust_win_rate,
     get_user_stats,
-    transfer_points
+    transfer_points,
+    get_leaderboard,
+    get_rank
 )
-from datetime import datetime
+from functions.render import create_embed, footer_text
+
+LEADERBOARD_PAGE_SIZE = 10
 
 
 class Admin(commands.Cog):
@@ -24,14 +28,7 @@ class Admin(commands.Cog):
 
     def create_embed(self, title: str, description: str, color: discord.Color = discord.Color.teal()) -> discord.Embed:
         """Helper function to create consistent embeds"""
-        embed = discord.Embed(
-            title=title,
-            description=description,
-            color=color
-        )
-        current_time = datetime.now().strftime("%I:%M %p")
-        embed.set_footer(text=f"Today at {current_time}")
-        return embed
+        return create_embed(title, description, color)
 
     @app_commands.command(name="setbalance", description="Set a user's balance to a specific amount")
     @app_commands.describe(user="The user to set balance for", amount="The amount to set")
@@ -45,7 +42,7 @@ class Admin(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
             
-        set_balance(user.id, amount)
+        await set_balance(user.id, amount)
         embed = self.create_embed(
             "Balance Updated",
             f"Set {user.mention}'s balance to {amount:,} points",
@@ -65,7 +62,7 @@ class Admin(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
             
-        add_balance(user.id, amount)
+        await add_balance(user.id, amount)
         embed = self.create_embed(
             "Balance Added",
             f"Added {amount:,} points to {user.mention}'s balance",
@@ -85,7 +82,7 @@ class Admin(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
             
-        remove_win_rate(user.id)
+        await remove_win_rate(user.id)
         embed = self.create_embed(
             "Win Rate Reset",
             f"Reset {user.mention}'s win rate to 0%",
@@ -105,7 +102,7 @@ class Admin(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
             
-        set_wins(user.id, wins)
+        await set_wins(user.id, wins)
         embed = self.create_embed(
             "Wins Updated",
             f"Set {user.mention}'s wins to {wins:,}",
@@ -125,7 +122,7 @@ class Admin(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
             
-        set_losses(user.id, losses)
+        await set_losses(user.id, losses)
         embed = self.create_embed(
             "Losses Updated",
             f"Set {user.mention}'s losses to {losses:,}",
@@ -153,7 +150,7 @@ class Admin(commands.Cog):
             )
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
-        adjust_win_rate(user.id, percentage)
+        await adjust_win_rate(user.id, percentage)
         embed = self.create_embed(
             "Win Rate Adjusted",
             f"Set {user.mention}'s win rate to {percentage:.1f}%",
@@ -163,7 +160,7 @@ class Admin(commands.Cog):
 
     @app_commands.command(name="stats", description="Show your game statistics")
     async def stats_command(self, interaction: discord.Interaction):
-        stats = get_user_stats(interaction.user.id)
+        stats = await get_user_stats(interaction.user.id)
         
         embed = discord.Embed(
             title=f"{interaction.user.name}'s Statistics",
@@ -208,11 +205,56 @@ class Admin(commands.Cog):
             inline=True
         )
         
-        current_time = datetime.now().strftime("%I:%M %p")
-        embed.set_footer(text=f"Today at {current_time}")
+        embed.set_footer(text=footer_text())
         
         await interaction.response.send_message(embed=embed)
 
+    @app_commands.command(name="leaderboard", description="Show the top players")
+    @app_commands.describe(page="The page to show", sort="What to rank players by")
+    @app_commands.choices(sort=[
+        app_commands.Choice(name="Points", value="points"),
+        app_commands.Choice(name="Win Rate", value="win_rate")
+    ])
+    async def leaderboard_command(self, interaction: discord.Interaction, page: int = 1, sort: str = "points"):
+        if page <= 0:
+            embed = self.create_embed(
+                "Invalid Page",
+                "Page must be greater than 0",
+                discord.Color.red()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        offset = (page - 1) * LEADERBOARD_PAGE_SIZE
+        rows = await get_leaderboard(LEADERBOARD_PAGE_SIZE, offset, sort)
+        if not rows:
+            embed = self.create_embed(
+                "Leaderboard",
+                "No players on this page"
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        if sort == "points":
+            lines = [f"**#{offset + index}** <@{user_id}> — {value:,} points" for index, (user_id, value) in enumerate(rows, 1)]
+        else:
+            lines = [f"**#{offset + index}** <@{user_id}> — {value:.1f}%" for index, (user_id, value) in enumerate(rows, 1)]
+
+        embed = self.create_embed(
+            f"Leaderboard — Page {page}",
+            "\n".join(lines)
+        )
+        await interaction.response.send_message(embed=embed)
+
+    @app_commands.command(name="rank", description="Show your place on the leaderboard")
+    async def rank_command(self, interaction: discord.Interaction):
+        rank, total = await get_rank(interaction.user.id)
+        embed = self.create_embed(
+            f"{interaction.user.name}'s Rank",
+            f"You are **#{rank:,}** of {total:,} players"
+        )
+        await interaction.response.send_message(embed=embed)
+
     @app_commands.command(name="transfer", description="Transfer your points to another user")
     @app_commands.describe(
         user="The user to transfer points to",
@@ -237,7 +279,7 @@ class Admin(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
             
-        success = transfer_points(interaction.user.id, user.id, amount)
+        success = await transfer_points(interaction.user.id, user.id, amount)
         
         if success:
             embed = self.create_embed(
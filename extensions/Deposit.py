@@ -4,7 +4,7 @@ import re
 from discord import app_commands
 from discord.ext import commands
 from config import STRIPE_API_KEY, STRIPE_WEBHOOK_SECRET, PAYMENT_CHANNEL_ID
-from functions.database import add_balance
+from functions.database import LEDGER_DEPOSIT, add_balance
 
 stripe.api_key = STRIPE_API_KEY
 
@@ -13,8 +13,9 @@ class Deposit(commands.Cog):
         self.bot = bot
         self.payment_channel = None
 
-    async def cog_load(self):
-        # Get the payment channel when the cog loads
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # The cog loads before the bot connects, so look the channel up once the cache is filled
         self.payment_channel = self.bot.get_channel(PAYMENT_CHANNEL_ID)
         if not self.payment_channel:
             print(f"Warning: Payment channel with ID {PAYMENT_CHANNEL_ID} not found!")
@@ -81,7 +82,7 @@ class Deposit(commands.Cog):
             user_id = int(match.group(2))
 
             # Add points to user's balance
-            add_balance(user_id, amount)
+            await add_balance(user_id, amount, LEDGER_DEPOSIT)
 
             # Send confirmation message
             embed = discord.Embed(
@@ -113,7 +114,7 @@ class Deposit(commands.Cog):
             session = event["data"]["object"]
             user_id = int(session["client_reference_id"])
             amount = int(session["amount_total"] / 100)  # Convert from cents
-            add_balance(user_id, amount)
+            await add_balance(user_id, amount, LEDGER_DEPOSIT)
             print(f"Balance Added {amount}")
 
 async def setup(bot: commands.Bot):
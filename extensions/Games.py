@@ -1,35 +1,215 @@
-import random
+import time
 import discord
 import asyncio
+import config
 from discord import app_commands
 from discord.ext import commands
 from functions.database import (
     get_user_stats,
-    add_balance,
-    set_balance
+    reserve_bet,
+    reserve_bet_entry,
+    reserve_contribution,
+    settle_bet,
+    settle_bet_entry,
+    settle_session,
+    refund_bet,
+    refund_bet_entry,
+    refund_contribution,
+    refund_session,
+    save_game_session,
+    save_game_session_entry,
+    delete_game_session,
+    delete_game_session_entry,
+    get_game_sessions
 )
 
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from functions.cards import Shoe, add_card, card_id, hand_value, score_hand
+from functions.fenwick import ContributionPool
+from functions.render import (
+    DESCRIPTION_LIMIT,
+    EmbedTemplate,
+    blackjack_hands,
+    create_embed,
+    join_lines
+)
+from functions.rng import RandomService
+from functions.rules import (
+    blackjack_payout,
+    coinflip_payout,
+    dice_multiplier,
+    dice_payout,
+    dice_win_chance,
+    dice_winnings,
+    flip_coin,
+    play_dealer,
+    roll_dice,
+    roulette_payout,
+    spin_roulette
+)
+from functions.scheduler import Scheduler
+
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+# Seconds a blackjack hand can sit idle before the bet is returned
+BLACKJACK_TIMEOUT = getattr(config, "BLACKJACK_TIMEOUT", 60)
+# Most hands that can be open at once at one channel's blackjack table
+BLACKJACK_MAX_HANDS = getattr(config, "BLACKJACK_MAX_HANDS", 500)
+# Decks in each table's shoe, and how far into it the cut card sits
+BLACKJACK_DECKS = getattr(config, "BLACKJACK_DECKS", 6)
+BLACKJACK_PENETRATION = getattr(config, "BLACKJACK_PENETRATION", 0.75)
+# Shuffle the next shoe ahead of time instead of when the cut card comes out
+BLACKJACK_PRESHUFFLE = getattr(config, "BLACKJACK_PRESHUFFLE", True)
+# Every round draws from its own seed, printed so the round can be replayed.
+# Setting RNG_SEED derives all of them from it, for reproducible test runs.
+RNG_SEED = getattr(config, "RNG_SEED", None)
+RNG_LOG = getattr(config, "RNG_LOG", True)
+
+# Embeds sent on every blackjack action
+BLACKJACK_EMBED = EmbedTemplate("🎲 Blackjack", discord.Color.teal())
+BLACKJACK_BUST_EMBED = EmbedTemplate("🎲 Blackjack - Bust!", discord.Color.red())
+BLACKJACK_WIN_EMBED = EmbedTemplate("🎲 Blackjack - Win!", discord.Color.green())
+BLACKJACK_LOSS_EMBED = EmbedTemplate("🎲 Blackjack - Loss!", discord.Color.red())
+BLACKJACK_PUSH_EMBED = EmbedTemplate("🎲 Blackjack - Push!", discord.Color.teal())
+
+
+@dataclass(slots=True)
+class BlackjackHand:
+    """One player's hand at a channel's blackjack table"""
+    player_id: int
+    amount: int
+    player_hand: List[int]
+    dealer_hand: List[int]
+    message_id: Optional[int] = None
+    last_action: float = 0.0
+    # Running scores, see functions.cards
+    player_score: int = 0
+    dealer_score: int = 0
+
+    @classmethod
+    def from_session(cls, data: Dict) -> "BlackjackHand":
+        """Rebuild a saved hand, including ones saved with string cards, a deck and no scores"""
+        data.pop("deck", None)
+        hand = cls(**data)
+        hand.player_hand = [card_id(card) for card in hand.player_hand]
+        hand.dealer_hand = [card_id(card) for card in hand.dealer_hand]
+        hand.player_score = score_hand(hand.player_hand)
+        hand.dealer_score = score_hand(hand.dealer_hand)
+        return hand
 
 
 class Games(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.active_roulette_games: Dict[int, Dict] = {}  # channel_id: game_data
-        self.active_blackjack_games: Dict[int, Dict] = {}  # channel_id: game_data
+        self.active_blackjack_games: Dict[int, Dict[int, BlackjackHand]] = {}  # channel_id: {user_id: hand}
+        self.shoes: Dict[int, Shoe] = {}  # channel_id: the table's shoe
+        self.roulette_joins: Set[Tuple[int, int]] = set()  # (channel_id, user_id) with a reservation in flight
+        self.rng = RandomService(RNG_SEED, RNG_LOG)
         self.active_jackpots: Dict[int, Dict] = {}  # channel_id: jackpot_data
+        self.scheduler = Scheduler({
+            "roulette": self._finish_roulette,
+            "blackjack": self._expire_blackjack,
+            "jackpot": self._finish_jackpot
+        })
+
+    async def cog_load(self):
+        # Bring back games that were running before a restart. The views look
+        # their game up by channel, so one persistent instance of each serves
+        # every game message, old and new.
+        await self._restore_sessions()
+        self.bot.add_view(RouletteView(self))
+        self.bot.add_view(BlackjackView(self))
+        self.bot.add_view(JackpotView(self))
+        await self.scheduler.start()
+
+    async def cog_unload(self):
+        self.scheduler.stop()
+
+    async def _restore_sessions(self):
+        for channel_id, (game, entries) in (await get_game_sessions("roulette")).items():
+            if not game:
+                # The bot stopped before the round got its message; hand the bets back
+                await refund_session([(bet["user_id"], bet["amount"]) for bet in entries.values()], "roulette", channel_id)
+                continue
+
+            game["bets"] = {}
+            for key, bet in sorted(entries.items()):
+                if key == bet["user_id"]:
+                    game["bets"][key] = bet
+                    continue
+
+                # Rounds saved before bets were keyed by user hold one entry per
+                # click; keep each user's first bet and hand back the rest
+                await delete_game_session_entry("roulette", channel_id, key)
+                if bet["user_id"] in game["bets"]:
+                    await refund_bet(bet["user_id"], bet["amount"])
+                else:
+                    game["bets"][bet["user_id"]] = bet
+                    await save_game_session_entry("roulette", channel_id, bet["user_id"], bet)
+            self.active_roulette_games[channel_id] = game
+
+        for channel_id, (_, hands) in (await get_game_sessions("blackjack")).items():
+            table = {}
+            for user_id, saved in hands.items():
+                hand = BlackjackHand.from_session(saved)
+                if hand.message_id is None:
+                    # The bot stopped before the hand was shown, and maybe before its expiry was scheduled
+                    await refund_bet_entry(user_id, hand.amount, "blackjack", channel_id)
+                else:
+                    table[user_id] = hand
+            if table:
+                self.active_blackjack_games[channel_id] = table
+
+        for channel_id, (jackpot, contributors) in (await get_game_sessions("jackpot")).items():
+            if not jackpot:
+                # The bot stopped before the jackpot got its message; hand the contributions back
+                await refund_session(list(contributors.items()), "jackpot", channel_id)
+                continue
+
+            jackpot["contributors"] = ContributionPool(contributors)
+            jackpot["total_amount"] = jackpot["contributors"].total
+            self.active_jackpots[channel_id] = jackpot
+
+    def _get_hand(self, channel_id: int, user_id: int) -> Optional[BlackjackHand]:
+        return self.active_blackjack_games.get(channel_id, {}).get(user_id)
+
+    def _shoe(self, channel_id: int, new_hand: bool = False) -> Shoe:
+        """The channel's shoe, reshuffled before a new hand once the cut card is out"""
+        shoe = self.shoes.get(channel_id)
+        if shoe is None:
+            shoe = self.shoes[channel_id] = Shoe(
+                BLACKJACK_DECKS,
+                BLACKJACK_PENETRATION,
+                BLACKJACK_PRESHUFFLE,
+                lambda cards: self.rng.round("blackjack", channel_id).shuffle(cards)
+            )
+        if new_hand and shoe.past_cut_card:
+            shoe.reshuffle()
+            if shoe.needs_spare:
+                # Shuffle the next shoe once this hand has been dealt
+                asyncio.get_running_loop().call_soon(shoe.shuffle_spare)
+        return shoe
+
+    def _remove_hand(self, channel_id: int, user_id: int):
+        table = self.active_blackjack_games.get(channel_id)
+        if table is None:
+            return
+        table.pop(user_id, None)
+        if not table:
+            del self.active_blackjack_games[channel_id]
+
+    async def _save_hand(self, channel_id: int, game: BlackjackHand):
+        await save_game_session_entry("blackjack", channel_id, game.player_id, asdict(game))
+
+    @staticmethod
+    def _session_state(game: Dict) -> Dict:
+        """The scalar part of a game; bets and contributions are saved one entry at a time"""
+        return {key: value for key, value in game.items() if key not in ("bets", "contributors")}
 
     def create_embed(self, title: str, description: str, color: discord.Color = discord.Color.teal()) -> discord.Embed:
         """Helper function to create consistent embeds"""
-        embed = discord.Embed(
-            title=title,
-            description=description,
-            color=color
-        )
-        current_time = datetime.now().strftime("%I:%M %p")
-        embed.set_footer(text=f"Today at {current_time}")
-        return embed
+        return create_embed(title, description, color)
 
     @app_commands.command(name="coinflip", description="Play a game of coinflip")
     @app_commands.describe(
@@ -50,9 +230,9 @@ class Games(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        # Check if user has enough points
-        stats = get_user_stats(interaction.user.id)
-        if stats['points'] < amount:
+        # Hold the bet, which fails if the user doesn't have enough points
+        balance = await reserve_bet(interaction.user.id, amount)
+        if balance is None:
             embed = self.create_embed(
                 "Insufficient Points",
                 "You don't have enough points to make this bet",
@@ -61,32 +241,30 @@ class Games(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        # Create initial embed showing the coin flipping
-        embed = self.create_embed(
-            "Coinflip",
-            f"🪙 The coin is flipping...\n\n"
-            f"Your bet: **{amount:,}** points on **{side.value.title()}**\n"
-            f"Current balance: **{stats['points']:,}** points",
-            discord.Color.teal()
-        )
-        message = await interaction.response.send_message(embed=embed)
+        try:
+            # Create initial embed showing the coin flipping
+            embed = self.create_embed(
+                "Coinflip",
+                f"🪙 The coin is flipping...\n\n"
+                f"Your bet: **{amount:,}** points on **{side.value.title()}**\n"
+                f"Current balance: **{balance + amount:,}** points",
+                discord.Color.teal()
+            )
+            await interaction.response.send_message(embed=embed)
 
-        # Wait for 2 seconds to simulate coin flipping
-        await asyncio.sleep(2)
+            # Wait for 2 seconds to simulate coin flipping
+            await asyncio.sleep(2)
 
-        # Generate result
-        result = random.choice(["heads", "tails"])
-        won = result == side.value
+            # Generate result
+            result = flip_coin(self.rng.round("coinflip", interaction.user.id))
+            won = result == side.value
+        except (Exception, asyncio.CancelledError):
+            # The flip never got to a result, so the held bet goes back
+            await refund_bet(interaction.user.id, amount)
+            raise
 
-        # Update points
-        if won:
-            # Add points to user (2x the bet)
-            add_balance(interaction.user.id, amount)
-            new_balance = stats['points'] + amount
-        else:
-            # Remove points from user
-            set_balance(interaction.user.id, stats['points'] - amount)
-            new_balance = stats['points'] - amount
+        # Settle the held bet (2x the bet back on a win)
+        new_balance = await settle_bet(interaction.user.id, coinflip_payout(amount, won), amount)
 
         # Create result embed
         if won:
@@ -122,7 +300,7 @@ class Games(commands.Cog):
             return
 
         # Check if user has enough points
-        stats = get_user_stats(interaction.user.id)
+        stats = await get_user_stats(interaction.user.id)
         if stats['points'] < amount:
             embed = self.create_embed(
                 "Insufficient Points",
@@ -144,15 +322,15 @@ class Games(commands.Cog):
             return
 
         # Calculate end time
-        end_time = datetime.now() + timedelta(seconds=30)
-        timestamp = int(end_time.timestamp())
+        end_time = time.time() + 30
+        timestamp = int(end_time)
 
         # Initialize new game
         self.active_roulette_games[channel_id] = {
             "host_id": interaction.user.id,
             "host_amount": amount,
-            "bets": [],
-            "message": None,
+            "bets": {},  # user_id: bet
+            "message_id": None,
             "end_time": end_time
         }
 
@@ -165,64 +343,21 @@ class Games(commands.Cog):
             f"Game ends <t:{timestamp}:R>",
             discord.Color.teal()
         )
-        view = RouletteView(self, amount)
-        message = await interaction.response.send_message(embed=embed, view=view)
-        self.active_roulette_games[channel_id]["message"] = message
-
-        # Start game timer
-        await asyncio.sleep(30)
-        
-        # Check if game still exists (might have been cancelled)
-        if channel_id not in self.active_roulette_games:
-            return
-
+        view = RouletteView(self)
         game = self.active_roulette_games[channel_id]
-        bets = game["bets"]
-        
-        if not bets:
-            embed = self.create_embed(
-                "Roulette Game Cancelled",
-                "No players joined the game.",
-                discord.Color.red()
-            )
-            await interaction.edit_original_response(embed=embed, view=None)
+        try:
+            await interaction.response.send_message(embed=embed, view=view)
+            message = await interaction.original_response()
+        except (Exception, asyncio.CancelledError):
+            # The round has no timer yet, so take it down and return anything already bet
             del self.active_roulette_games[channel_id]
-            return
+            await refund_session([(bet["user_id"], bet["amount"]) for bet in game["bets"].values()], "roulette", channel_id)
+            raise
+        game["message_id"] = message.id
+        await save_game_session("roulette", channel_id, self._session_state(game))
 
-        # Show spinning animation
-        embed = self.create_embed(
-            "🎲 Roulette Spinning",
-            "The wheel is spinning...",
-            discord.Color.teal()
-        )
-        await interaction.edit_original_response(embed=embed, view=None)
-        await asyncio.sleep(3)
-
-        # Generate result
-        result = random.choice(["red", "black"])
-        result_number = random.randint(0, 36)
-        
-        # Process results
-        winners = []
-        losers = []
-        for bet in bets:
-            if bet["color"] == result:
-                add_balance(bet["user_id"], bet["amount"])
-                winners.append(f"<@{bet['user_id']}> won {bet['amount']:,} points")
-            else:
-                set_balance(bet["user_id"], get_user_stats(bet["user_id"])["points"] - bet["amount"])
-                losers.append(f"<@{bet['user_id']}> lost {bet['amount']:,} points")
-
-        # Create result embed
-        result_embed = self.create_embed(
-            "🎲 Roulette Result",
-            f"**{result.title()} {result_number}**!\n\n"
-            f"**Winners:**\n" + "\n".join(winners) + "\n\n"
-            f"**Losers:**\n" + "\n".join(losers),
-            discord.Color.green() if winners else discord.Color.red()
-        )
-        await interaction.edit_original_response(embed=result_embed)
-        del self.active_roulette_games[channel_id]
+        # Start game timer
+        await self.scheduler.schedule("roulette", end_time, {"channel_id": channel_id})
 
     @app_commands.command(name="blackjack", description="Play a game of blackjack")
     @app_commands.describe(amount="The amount of points to bet")
@@ -236,56 +371,90 @@ class Games(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        # Check if user has enough points
-        stats = get_user_stats(interaction.user.id)
-        if stats['points'] < amount:
+        # Check if user is already in a game
+        channel_id = interaction.channel_id
+        if self._get_hand(channel_id, interaction.user.id):
             embed = self.create_embed(
-                "Insufficient Points",
-                "You don't have enough points to make this bet",
+                "Game in Progress",
+                "You already have a blackjack hand in progress in this channel.",
                 discord.Color.red()
             )
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        # Check if user is already in a game
-        channel_id = interaction.channel_id
-        if channel_id in self.active_blackjack_games:
+        if len(self.active_blackjack_games.get(channel_id, {})) >= BLACKJACK_MAX_HANDS:
             embed = self.create_embed(
-                "Game in Progress",
-                "There is already a blackjack game in progress in this channel.",
+                "Table Full",
+                "The blackjack table in this channel is full, try again in a moment.",
                 discord.Color.red()
             )
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        # Initialize game
-        deck = self._create_deck()
-        player_hand = [deck.pop(), deck.pop()]
-        dealer_hand = [deck.pop(), deck.pop()]
+        # Deal and take the seat before the first await, so a second
+        # /blackjack from the same user finds this hand and stops above
+        shoe = self._shoe(channel_id, new_hand=True)
+        player_hand = [shoe.draw(), shoe.draw()]
+        dealer_hand = [shoe.draw(), shoe.draw()]
+        dealt = shoe.mark()
+
+        game = BlackjackHand(
+            player_id=interaction.user.id,
+            amount=amount,
+            player_hand=player_hand,
+            dealer_hand=dealer_hand,
+            last_action=time.time(),
+            player_score=score_hand(player_hand),
+            dealer_score=score_hand(dealer_hand)
+        )
+        self.active_blackjack_games.setdefault(channel_id, {})[interaction.user.id] = game
+
+        # Hold the bet and save the hand in one transaction, which fails if the user doesn't have enough points
+        try:
+            balance = await reserve_bet_entry(interaction.user.id, amount, "blackjack", channel_id, asdict(game))
+        except (Exception, asyncio.CancelledError):
+            self._remove_hand(channel_id, game.player_id)
+            raise
+        if balance is None:
+            self._remove_hand(channel_id, game.player_id)
+            # The cards go back on top unless the table drew or reshuffled meanwhile
+            shoe.undraw(dealt, len(player_hand) + len(dealer_hand))
+            embed = self.create_embed(
+                "Insufficient Points",
+                "You don't have enough points to make this bet",
+                discord.Color.red()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
 
-        self.active_blackjack_games[channel_id] = {
-            "player_id": interaction.user.id,
-            "amount": amount,
-            "deck": deck,
-            "player_hand": player_hand,
-            "dealer_hand": dealer_hand,
-            "message": None
-        }
+        try:
+            # Schedule the expiry before any Discord call, so the bet comes back
+            # even if the message never goes out
+            await self.scheduler.schedule(
+                "blackjack",
+                game.last_action + BLACKJACK_TIMEOUT,
+                {"channel_id": channel_id, "user_id": game.player_id}
+            )
 
-        # Create initial game embed
-        player_value = self._calculate_hand_value(player_hand)
-        dealer_value = self._calculate_hand_value([dealer_hand[0]])
-        
-        embed = self.create_embed(
-            "🎲 Blackjack",
-            f"**Your Hand** ({player_value}):\n{self._format_hand(player_hand)}\n\n"
-            f"**Dealer's Hand** ({dealer_value}):\n{self._format_card(dealer_hand[0])} 🃏\n\n"
-            f"**Your Points:** {stats['points']:,}\n"
-            f"**Bet Amount:** {amount:,}\n\n"
-            "Choose your action:",
-            discord.Color.teal()
-        )
-        message = await interaction.response.send_message(embed=embed, view=BlackjackView(self))
+            # Create initial game embed
+            player_value = hand_value(game.player_score)
+            dealer_value = hand_value(add_card(0, dealer_hand[0]))
+
+            embed = BLACKJACK_EMBED.render(
+                f"{blackjack_hands(player_hand, player_value, dealer_hand, dealer_value, hide_hole_card=True)}\n\n"
+                f"**Your Points:** {balance:,}\n"
+                f"**Bet Amount:** {amount:,}\n\n"
+                "Choose your action:"
+            )
+            await interaction.response.send_message(embed=embed, view=BlackjackView(self))
+            message = await interaction.original_response()
+        except (Exception, asyncio.CancelledError):
+            # The hand never reached the player, so the held bet goes back
+            self._remove_hand(channel_id, game.player_id)
+            await refund_bet_entry(game.player_id, amount, "blackjack", channel_id)
+            raise
+        game.message_id = message.id
+        await self._save_hand(channel_id, game)
 
     @app_commands.command(name="jackpot", description="Start a jackpot game")
     @app_commands.describe(
@@ -311,9 +480,19 @@ class Games(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        # Check if user has enough points
-        stats = get_user_stats(interaction.user.id)
-        if stats['points'] < amount:
+        # Check if there's already a jackpot in this channel
+        channel_id = interaction.channel_id
+        if channel_id in self.active_jackpots:
+            embed = self.create_embed(
+                "Game in Progress",
+                "There is already a jackpot in progress in this channel.",
+                discord.Color.red()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
+
+        # Deduct points from host, which fails if they don't have enough
+        if await reserve_contribution(interaction.user.id, amount, "jackpot", channel_id) is None:
             embed = self.create_embed(
                 "Insufficient Points",
                 "You don't have enough points to contribute to the jackpot",
@@ -322,9 +501,9 @@ class Games(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        # Check if there's already a jackpot in this channel
-        channel_id = interaction.channel_id
+        # Another /jackpot may have started one here while the hold was written
         if channel_id in self.active_jackpots:
+            await refund_contribution(interaction.user.id, amount, "jackpot", channel_id)
             embed = self.create_embed(
                 "Game in Progress",
                 "There is already a jackpot in progress in this channel.",
@@ -334,19 +513,16 @@ class Games(commands.Cog):
             return
 
         # Create new jackpot
-        end_time = datetime.now() + timedelta(days=duration)
+        end_time = time.time() + duration * 24 * 60 * 60
         self.active_jackpots[channel_id] = {
             "host_id": interaction.user.id,
             "total_amount": amount,
-            "contributors": {interaction.user.id: amount},
+            "contributors": ContributionPool({interaction.user.id: amount}),
             "end_time": end_time,
-            "message": None,
+            "message_id": None,
             "amount": amount
         }
 
-        # Deduct points from host
-        set_balance(interaction.user.id, stats["points"] - amount)
-
         # Format duration display
         if duration < 1:
             if duration < 1/24:  # Less than an hour
@@ -367,51 +543,27 @@ class Games(commands.Cog):
             f"**{interaction.user.mention}** started a jackpot!\n\n"
             f"**Initial Contribution:** {amount:,} points ({percentage:.1f}% chance)\n"
             f"**Duration:** {duration_display}\n"
-            f"**Ends:** <t:{int(end_time.timestamp())}:R>\n\n"
+            f"**Ends:** <t:{int(end_time)}:R>\n\n"
             "Click the Join button to participate!\n"
             "The more you contribute, the higher your chance to win!",
             discord.Color.teal()
         )
-        view = JackpotView(self, amount)
-        message = await interaction.response.send_message(embed=embed, view=view)
-        self.active_jackpots[channel_id]["message"] = message
-
-        # Start jackpot timer
-        await asyncio.sleep(duration * 24 * 60 * 60)  # Convert days to seconds
-
-        # Check if jackpot still exists
-        if channel_id not in self.active_jackpots:
-            return
-
+        view = JackpotView(self)
         jackpot = self.active_jackpots[channel_id]
-        
-        # Select winner based on contribution weights
-        total_contributions = sum(jackpot["contributors"].values())
-        random_value = random.uniform(0, total_contributions)
-        current_sum = 0
-        winner_id = None
-
-        for user_id, contribution in jackpot["contributors"].items():
-            current_sum += contribution
-            if random_value <= current_sum:
-                winner_id = user_id
-                break
-
-        # Award winner
-        add_balance(winner_id, jackpot["total_amount"])
+        try:
+            await interaction.response.send_message(embed=embed, view=view)
+            message = await interaction.original_response()
+        except (Exception, asyncio.CancelledError):
+            # The jackpot has no timer yet, so take it down and return every contribution
+            if self.active_jackpots.get(channel_id) is jackpot:
+                del self.active_jackpots[channel_id]
+            await refund_session(list(jackpot["contributors"].items()), "jackpot", channel_id)
+            raise
+        jackpot["message_id"] = message.id
+        await save_game_session("jackpot", channel_id, self._session_state(jackpot))
 
-        # Create result embed with contribution details
-        result_embed = self.create_embed(
-            "🎰 Jackpot Winner!",
-            f"**<@{winner_id}>** won the jackpot of **{jackpot['total_amount']:,}** points!\n\n"
-            f"**Total Participants:** {len(jackpot['contributors'])}\n"
-            f"**Total Contributions:** {jackpot['total_amount']:,} points\n"
-            f"**Winner's Contribution:** {jackpot['contributors'][winner_id]:,} points ({(jackpot['contributors'][winner_id] / jackpot['total_amount'] * 100):.1f}% chance)\n\n"
-            "Congratulations to the winner! 🎉",
-            discord.Color.green()
-        )
-        await interaction.edit_original_response(embed=result_embed, view=None)
-        del self.active_jackpots[channel_id]
+        # Start jackpot timer
+        await self.scheduler.schedule("jackpot", end_time, {"channel_id": channel_id})
 
     @app_commands.command(name="dice", description="Roll a dice and win if you roll above the target number")
     @app_commands.describe(
@@ -433,9 +585,8 @@ class Games(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        # Check if user has enough points
-        stats = get_user_stats(interaction.user.id)
-        if stats['points'] < amount:
+        # Hold the bet, which fails if the user doesn't have enough points
+        if await reserve_bet(interaction.user.id, amount) is None:
             embed = self.create_embed(
                 "Insufficient Points",
                 "You don't have enough points to make this bet",
@@ -444,40 +595,42 @@ class Games(commands.Cog):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        # Calculate win chance and multiplier
-        win_chance = (6 - target.value) / 6 * 100
-        multiplier = 6 / (6 - target.value)  # Higher target = higher multiplier
+        try:
+            # Calculate win chance and multiplier
+            win_chance = dice_win_chance(target.value) * 100
+            multiplier = dice_multiplier(target.value)  # Higher target = higher multiplier
 
-        # Create initial embed
-        embed = self.create_embed(
-            "🎲 Dice Roll",
-            f"**{interaction.user.mention}** is rolling a dice!\n\n"
-            f"**Target:** Above {target.value}\n"
-            f"**Bet Amount:** {amount:,} points\n"
-            f"**Win Chance:** {win_chance:.1f}%\n"
-            f"**Multiplier:** {multiplier:.2f}x\n\n"
-            "Rolling the dice...",
-            discord.Color.teal()
-        )
-        message = await interaction.response.send_message(embed=embed)
+            # Create initial embed
+            embed = self.create_embed(
+                "🎲 Dice Roll",
+                f"**{interaction.user.mention}** is rolling a dice!\n\n"
+                f"**Target:** Above {target.value}\n"
+                f"**Bet Amount:** {amount:,} points\n"
+                f"**Win Chance:** {win_chance:.1f}%\n"
+                f"**Multiplier:** {multiplier:.2f}x\n\n"
+                "Rolling the dice...",
+                discord.Color.teal()
+            )
+            await interaction.response.send_message(embed=embed)
 
-        # Wait for dramatic effect
-        await asyncio.sleep(2)
+            # Wait for dramatic effect
+            await asyncio.sleep(2)
 
-        # Roll the dice
-        roll = random.randint(1, 6)
-        won = roll > target.value
+            # Roll the dice
+            roll = roll_dice(self.rng.round("dice", interaction.user.id))
+            won = roll > target.value
+        except (Exception, asyncio.CancelledError):
+            # The roll never got to a result, so the held bet goes back
+            await refund_bet(interaction.user.id, amount)
+            raise
 
         # Update points
+        new_balance = await settle_bet(interaction.user.id, dice_payout(amount, target.value, roll), amount)
         if won:
-            winnings = int(amount * multiplier)
-            add_balance(interaction.user.id, winnings)
-            new_balance = stats['points'] + winnings
+            winnings = dice_winnings(amount, target.value)
             result_color = discord.Color.green()
             result_message = f"🎉 You rolled a **{roll}** and won **{winnings:,}** points!"
         else:
-            set_balance(interaction.user.id, stats['points'] - amount)
-            new_balance = stats['points'] - amount
             result_color = discord.Color.red()
             result_message = f"😢 You rolled a **{roll}** and lost **{amount:,}** points."
 
@@ -493,78 +646,166 @@ class Games(commands.Cog):
         )
         await interaction.edit_original_response(embed=result_embed)
 
-    def _create_deck(self) -> List[str]:
-        """Create a shuffled deck of cards"""
-        suits = ["♠", "♥", "♦", "♣"]
-        values = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
-        deck = [f"{value}{suit}" for suit in suits for value in values]
-        random.shuffle(deck)
-        return deck
-
-    def _format_hand(self, hand: List[str]) -> str:
-        """Format a hand of cards for display"""
-        return " ".join(self._format_card(card) for card in hand)
-
-    def _format_card(self, card: str) -> str:
-        """Format a single card for display"""
-        suit = card[-1]
-        value = card[:-1]
-        
-        # Map suits to emojis
-        suit_emoji = {
-            "♠": "♠️",
-            "♥": "♥️",
-            "♦": "♦️",
-            "♣": "♣️"
-        }
-        
-        # Map values to emojis
-        value_emoji = {
-            "A": "🅰️",
-            "K": "👑",
-            "Q": "👸",
-            "J": "🎭"
-        }
-        
-        # Format the card
-        if value in value_emoji:
-            return f"{value_emoji[value]}{suit_emoji[suit]}"
-        else:
-            return f"{value}{suit_emoji[suit]}"
-
-    def _calculate_hand_value(self, hand: List[str]) -> int:
-        """Calculate the value of a hand"""
-        value = 0
-        aces = 0
-        for card in hand:
-            rank = card[:-1]
-            if rank in ["J", "Q", "K"]:
-                value += 10
-            elif rank == "A":
-                aces += 1
-                value += 11
-            else:
-                value += int(rank)
-        
-        # Adjust for aces
-        while value > 21 and aces > 0:
-            value -= 10
-            aces -= 1
-        
-        return value
+    def _game_message(self, channel_id: int, message_id: int) -> discord.PartialMessage:
+        """The game's public message, editable long after the interaction token expires"""
+        return self.bot.get_partial_messageable(channel_id).get_partial_message(message_id)
+
+    async def _edit_game_message(self, message: discord.PartialMessage, **fields) -> bool:
+        """Edit a game's message once its money is settled; a deleted message or channel is only logged"""
+        try:
+            await message.edit(**fields)
+        except discord.HTTPException as error:
+            print(f"🟥 | Couldn't update game message {message.id} in {message.channel.id}: {error}")
+            return False
+        return True
+
+    async def _finish_roulette(self, payload: dict):
+        """Scheduled when a roulette round starts; spins the wheel and settles every bet"""
+        channel_id = payload["channel_id"]
+
+        # Take the round off the table so late joins get refunded instead of landing here
+        game = self.active_roulette_games.pop(channel_id, None)
+        if game is None:
+            return
+
+        message = self._game_message(channel_id, game["message_id"])
+        bets = game["bets"]
+
+        if not bets:
+            try:
+                await delete_game_session("roulette", channel_id)
+            except Exception:
+                # Back on the table for the scheduler's retry
+                self.active_roulette_games[channel_id] = game
+                raise
+            embed = self.create_embed(
+                "Roulette Game Cancelled",
+                "No players joined the game.",
+                discord.Color.red()
+            )
+            await self._edit_game_message(message, embed=embed, view=None)
+            return
+
+        # Spin and settle before any Discord call, so a failed edit can't leave the stakes held
+        result, result_number = spin_roulette(self.rng.round("roulette", channel_id))
+
+        # Process results
+        winners = []
+        losers = []
+        payouts = []
+        for bet in bets.values():
+            won = bet["color"] == result
+            payouts.append((bet["user_id"], roulette_payout(bet["amount"], won), bet["amount"]))
+            (winners if won else losers).append(bet)
+
+        # Settle the whole round and close its session in one transaction
+        try:
+            await settle_session(payouts, "roulette", channel_id)
+        except Exception:
+            # Back on the table for the scheduler's retry, which spins again
+            self.active_roulette_games[channel_id] = game
+            raise
+
+        # Show spinning animation
+        embed = self.create_embed(
+            "🎲 Roulette Spinning",
+            "The wheel is spinning...",
+            discord.Color.teal()
+        )
+        if not await self._edit_game_message(message, embed=embed, view=None):
+            return
+        await asyncio.sleep(3)
+
+        # Create result embed, giving each list half the description so a crowded round still fits
+        list_limit = DESCRIPTION_LIMIT // 2 - 32
+        result_embed = self.create_embed(
+            "🎲 Roulette Result",
+            f"**{result.title()} {result_number}**!\n\n"
+            f"**Winners:**\n" + join_lines(winners, list_limit, lambda bet: f"<@{bet['user_id']}> won {bet['amount']:,} points") + "\n\n"
+            f"**Losers:**\n" + join_lines(losers, list_limit, lambda bet: f"<@{bet['user_id']}> lost {bet['amount']:,} points"),
+            discord.Color.green() if winners else discord.Color.red()
+        )
+        await self._edit_game_message(message, embed=result_embed)
+
+    async def _finish_jackpot(self, payload: dict):
+        """Scheduled when a jackpot starts; draws the winner and pays out the pot"""
+        channel_id = payload["channel_id"]
+
+        # Check if jackpot still exists
+        jackpot = self.active_jackpots.pop(channel_id, None)
+        if jackpot is None:
+            return
+
+        # Select winner based on contribution weights
+        winner_id = jackpot["contributors"].draw(self.rng.round("jackpot", channel_id))
+
+        # Award winner; everyone else's contribution is settled as a loss
+        try:
+            await settle_session([
+                (user_id, jackpot["total_amount"] if user_id == winner_id else 0, amount)
+                for user_id, amount in jackpot["contributors"].items()
+            ], "jackpot", channel_id)
+        except Exception:
+            # Back on the table for the scheduler's retry, which draws again
+            self.active_jackpots[channel_id] = jackpot
+            raise
+
+        # Create result embed with contribution details
+        result_embed = self.create_embed(
+            "🎰 Jackpot Winner!",
+            f"**<@{winner_id}>** won the jackpot of **{jackpot['total_amount']:,}** points!\n\n"
+            f"**Total Participants:** {len(jackpot['contributors'])}\n"
+            f"**Total Contributions:** {jackpot['total_amount']:,} points\n"
+            f"**Winner's Contribution:** {jackpot['contributors'][winner_id]:,} points ({jackpot['contributors'].odds(winner_id) * 100:.1f}% chance)\n\n"
+            "Congratulations to the winner! 🎉",
+            discord.Color.green()
+        )
+        await self._edit_game_message(self._game_message(channel_id, jackpot["message_id"]), embed=result_embed, view=None)
+
+    async def _expire_blackjack(self, payload: dict):
+        """Scheduled when a hand is dealt; returns the bet if the player walked away"""
+        channel_id = payload["channel_id"]
+        game = self._get_hand(channel_id, payload["user_id"])
+        if game is None:
+            return
+
+        # The player acted since this was scheduled, check again later
+        deadline = game.last_action + BLACKJACK_TIMEOUT
+        if time.time() < deadline:
+            await self.scheduler.schedule("blackjack", deadline, payload)
+            return
+
+        self._remove_hand(channel_id, game.player_id)
+        try:
+            balance = await refund_bet_entry(game.player_id, game.amount, "blackjack", channel_id)
+        except Exception:
+            # Back on the table for the scheduler's retry
+            self.active_blackjack_games.setdefault(channel_id, {})[game.player_id] = game
+            raise
+        if game.message_id is None:
+            # The bot stopped before the hand was shown
+            return
+
+        embed = self.create_embed(
+            "🎲 Blackjack - Timed Out",
+            f"**Your Points:** {balance:,}\n"
+            f"**Bet Amount:** {game.amount:,}\n\n"
+            "The hand was abandoned. Your bet is returned.",
+            discord.Color.teal()
+        )
+        await self._edit_game_message(self._game_message(channel_id, game.message_id), embed=embed, view=None)
 
 
 class RouletteView(discord.ui.View):
-    def __init__(self, cog: Games, amount: int):
-        super().__init__(timeout=30)
+    def __init__(self, cog: Games):
+        super().__init__(timeout=None)  # The round's deadline is on the scheduler
         self.cog = cog
-        self.amount = amount
 
-    @discord.ui.button(label="Join Red", style=discord.ButtonStyle.red)
+    @discord.ui.button(label="Join Red", style=discord.ButtonStyle.red, custom_id="roulette:red")
     async def join_red(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self._join_game(interaction, "red")
 
-    @discord.ui.button(label="Join Black", style=discord.ButtonStyle.grey)
+    @discord.ui.button(label="Join Black", style=discord.ButtonStyle.grey, custom_id="roulette:black")
     async def join_black(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self._join_game(interaction, "black")
 
@@ -576,27 +817,52 @@ class RouletteView(discord.ui.View):
             await interaction.response.send_message("This game has already ended!", ephemeral=True)
             return
 
-        # Check if user has enough points
-        stats = get_user_stats(interaction.user.id)
-        if stats['points'] < self.amount:
-            embed = self.cog.create_embed(
-                "Insufficient Points",
-                "You don't have enough points to join this game",
-                discord.Color.red()
-            )
+        amount = game["host_amount"]
+        user_id = interaction.user.id
+
+        # One bet per player per round, so repeat clicks (even ones landing
+        # while the first is still being reserved) change nothing
+        placed = game["bets"].get(user_id)
+        join = (channel_id, user_id)
+        if placed is not None or join in self.cog.roulette_joins:
+            description = "You have already joined this round."
+            if placed is not None:
+                description = f"You already have **{placed['amount']:,}** points on **{placed['color'].title()}** in this round."
+            embed = self.cog.create_embed("Already Joined", description, discord.Color.red())
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        # Add bet to game
-        game["bets"].append({
-            "user_id": interaction.user.id,
+        bet = {
+            "user_id": user_id,
             "color": color,
-            "amount": self.amount
-        })
+            "amount": amount
+        }
+        self.cog.roulette_joins.add(join)
+        try:
+            # Hold the bet until the round is settled, saving it with the hold
+            if await reserve_bet_entry(user_id, amount, "roulette", channel_id, bet) is None:
+                embed = self.cog.create_embed(
+                    "Insufficient Points",
+                    "You don't have enough points to join this game",
+                    discord.Color.red()
+                )
+                await interaction.response.send_message(embed=embed, ephemeral=True)
+                return
+
+            # The round may have been settled while the hold was being written
+            if self.cog.active_roulette_games.get(channel_id) is not game:
+                await refund_bet_entry(user_id, amount, "roulette", channel_id)
+                await interaction.response.send_message("This game has already ended!", ephemeral=True)
+                return
+
+            # Add bet to game
+            game["bets"][user_id] = bet
+        finally:
+            self.cog.roulette_joins.discard(join)
 
         embed = self.cog.create_embed(
             "Bet Placed",
-            f"Your bet of **{self.amount:,}** points on **{color.title()}** has been placed.\n"
+            f"Your bet of **{amount:,}** points on **{color.title()}** has been placed.\n"
             "Waiting for other players...",
             discord.Color.teal()
         )
@@ -605,129 +871,118 @@ class RouletteView(discord.ui.View):
 
 class BlackjackView(discord.ui.View):
     def __init__(self, cog: Games):
-        super().__init__(timeout=60)
+        super().__init__(timeout=None)  # Abandoned hands are expired by the scheduler
         self.cog = cog
 
-    @discord.ui.button(label="Hit", style=discord.ButtonStyle.green)
+    @discord.ui.button(label="Hit", style=discord.ButtonStyle.green, custom_id="blackjack:hit")
     async def hit(self, interaction: discord.Interaction, button: discord.ui.Button):
         channel_id = interaction.channel_id
-        game = self.cog.active_blackjack_games.get(channel_id)
-        
-        if not game or game["player_id"] != interaction.user.id:
+        game = self.cog._get_hand(channel_id, interaction.user.id)
+
+        if not game or game.message_id != interaction.message.id:
             await interaction.response.send_message("This is not your game!", ephemeral=True)
             return
 
         # Draw a card
-        game["player_hand"].append(game["deck"].pop())
-        player_value = self.cog._calculate_hand_value(game["player_hand"])
-        dealer_value = self.cog._calculate_hand_value([game["dealer_hand"][0]])
-        stats = get_user_stats(interaction.user.id)
+        card = self.cog._shoe(channel_id).draw()
+        game.player_hand.append(card)
+        game.player_score = add_card(game.player_score, card)
+        player_value = hand_value(game.player_score)
+        dealer_value = hand_value(add_card(0, game.dealer_hand[0]))
 
         if player_value > 21:
-            # Player busts
-            embed = self.cog.create_embed(
-                "🎲 Blackjack - Bust!",
-                f"**Your Hand** ({player_value}):\n{self.cog._format_hand(game['player_hand'])}\n\n"
-                f"**Dealer's Hand** ({self.cog._calculate_hand_value(game['dealer_hand'])}):\n{self.cog._format_hand(game['dealer_hand'])}\n\n"
-                f"**Your Points:** {stats['points']:,}\n"
-                f"**Bet Amount:** {game['amount']:,}\n\n"
-                f"You busted and lost {game['amount']:,} points!",
-                discord.Color.red()
+            # Player busts, the held bet is lost
+            self.cog._remove_hand(channel_id, interaction.user.id)
+            balance = await settle_bet_entry(interaction.user.id, 0, game.amount, "blackjack", channel_id)
+            embed = BLACKJACK_BUST_EMBED.render(
+                f"{blackjack_hands(game.player_hand, player_value, game.dealer_hand, hand_value(game.dealer_score))}\n\n"
+                f"**Your Points:** {balance:,}\n"
+                f"**Bet Amount:** {game.amount:,}\n\n"
+                f"You busted and lost {game.amount:,} points!"
             )
-            set_balance(interaction.user.id, stats["points"] - game["amount"])
             await interaction.response.edit_message(embed=embed, view=None)
-            del self.cog.active_blackjack_games[channel_id]
             return
 
-        embed = self.cog.create_embed(
-            "🎲 Blackjack",
-            f"**Your Hand** ({player_value}):\n{self.cog._format_hand(game['player_hand'])}\n\n"
-            f"**Dealer's Hand** ({dealer_value}):\n{self.cog._format_card(game['dealer_hand'][0])} 🃏\n\n"
+        game.last_action = time.time()
+        await self.cog._save_hand(channel_id, game)
+        stats = await get_user_stats(interaction.user.id)
+
+        embed = BLACKJACK_EMBED.render(
+            f"{blackjack_hands(game.player_hand, player_value, game.dealer_hand, dealer_value, hide_hole_card=True)}\n\n"
             f"**Your Points:** {stats['points']:,}\n"
-            f"**Bet Amount:** {game['amount']:,}\n\n"
-            "Choose your action:",
-            discord.Color.teal()
+            f"**Bet Amount:** {game.amount:,}\n\n"
+            "Choose your action:"
         )
         await interaction.response.edit_message(embed=embed)
 
-    @discord.ui.button(label="Stand", style=discord.ButtonStyle.red)
+    @discord.ui.button(label="Stand", style=discord.ButtonStyle.red, custom_id="blackjack:stand")
     async def stand(self, interaction: discord.Interaction, button: discord.ui.Button):
         channel_id = interaction.channel_id
-        game = self.cog.active_blackjack_games.get(channel_id)
-        
-        if not game or game["player_id"] != interaction.user.id:
+        game = self.cog._get_hand(channel_id, interaction.user.id)
+
+        if not game or game.message_id != interaction.message.id:
             await interaction.response.send_message("This is not your game!", ephemeral=True)
             return
 
-        # Dealer's turn
-        dealer_value = self.cog._calculate_hand_value(game["dealer_hand"])
-        while dealer_value < 17:
-            game["dealer_hand"].append(game["deck"].pop())
-            dealer_value = self.cog._calculate_hand_value(game["dealer_hand"])
-
-        player_value = self.cog._calculate_hand_value(game["player_hand"])
-        stats = get_user_stats(interaction.user.id)
+        # Take the game off the table first so a double click can't settle it twice
+        self.cog._remove_hand(channel_id, interaction.user.id)
 
-        # Determine winner
+        # Dealer's turn
+        game.dealer_score = play_dealer(self.cog._shoe(channel_id), game.dealer_hand, game.dealer_score)
+        dealer_value = hand_value(game.dealer_score)
+        player_value = hand_value(game.player_score)
+        hands = blackjack_hands(game.player_hand, player_value, game.dealer_hand, dealer_value)
+
+        # Settle the held bet, then describe the outcome
+        balance = await settle_bet_entry(
+            interaction.user.id,
+            blackjack_payout(game.amount, player_value, dealer_value),
+            game.amount,
+            "blackjack",
+            channel_id
+        )
         if dealer_value > 21:
             # Dealer busts
-            add_balance(interaction.user.id, game["amount"])
-            embed = self.cog.create_embed(
-                "🎲 Blackjack - Win!",
-                f"**Your Hand** ({player_value}):\n{self.cog._format_hand(game['player_hand'])}\n\n"
-                f"**Dealer's Hand** ({dealer_value}):\n{self.cog._format_hand(game['dealer_hand'])}\n\n"
-                f"**Your Points:** {stats['points'] + game['amount']:,}\n"
-                f"**Bet Amount:** {game['amount']:,}\n\n"
-                f"Dealer busted! You won {game['amount']:,} points!",
-                discord.Color.green()
+            embed = BLACKJACK_WIN_EMBED.render(
+                f"{hands}\n\n"
+                f"**Your Points:** {balance:,}\n"
+                f"**Bet Amount:** {game.amount:,}\n\n"
+                f"Dealer busted! You won {game.amount:,} points!"
             )
         elif player_value > dealer_value:
             # Player wins
-            add_balance(interaction.user.id, game["amount"])
-            embed = self.cog.create_embed(
-                "🎲 Blackjack - Win!",
-                f"**Your Hand** ({player_value}):\n{self.cog._format_hand(game['player_hand'])}\n\n"
-                f"**Dealer's Hand** ({dealer_value}):\n{self.cog._format_hand(game['dealer_hand'])}\n\n"
-                f"**Your Points:** {stats['points'] + game['amount']:,}\n"
-                f"**Bet Amount:** {game['amount']:,}\n\n"
-                f"You won {game['amount']:,} points!",
-                discord.Color.green()
+            embed = BLACKJACK_WIN_EMBED.render(
+                f"{hands}\n\n"
+                f"**Your Points:** {balance:,}\n"
+                f"**Bet Amount:** {game.amount:,}\n\n"
+                f"You won {game.amount:,} points!"
             )
         elif player_value < dealer_value:
             # Dealer wins
-            set_balance(interaction.user.id, stats["points"] - game["amount"])
-            embed = self.cog.create_embed(
-                "🎲 Blackjack - Loss!",
-                f"**Your Hand** ({player_value}):\n{self.cog._format_hand(game['player_hand'])}\n\n"
-                f"**Dealer's Hand** ({dealer_value}):\n{self.cog._format_hand(game['dealer_hand'])}\n\n"
-                f"**Your Points:** {stats['points'] - game['amount']:,}\n"
-                f"**Bet Amount:** {game['amount']:,}\n\n"
-                f"You lost {game['amount']:,} points!",
-                discord.Color.red()
+            embed = BLACKJACK_LOSS_EMBED.render(
+                f"{hands}\n\n"
+                f"**Your Points:** {balance:,}\n"
+                f"**Bet Amount:** {game.amount:,}\n\n"
+                f"You lost {game.amount:,} points!"
             )
         else:
             # Push
-            embed = self.cog.create_embed(
-                "🎲 Blackjack - Push!",
-                f"**Your Hand** ({player_value}):\n{self.cog._format_hand(game['player_hand'])}\n\n"
-                f"**Dealer's Hand** ({dealer_value}):\n{self.cog._format_hand(game['dealer_hand'])}\n\n"
-                f"**Your Points:** {stats['points']:,}\n"
-                f"**Bet Amount:** {game['amount']:,}\n\n"
-                "It's a push! Your bet is returned.",
-                discord.Color.teal()
+            embed = BLACKJACK_PUSH_EMBED.render(
+                f"{hands}\n\n"
+                f"**Your Points:** {balance:,}\n"
+                f"**Bet Amount:** {game.amount:,}\n\n"
+                "It's a push! Your bet is returned."
             )
 
         await interaction.response.edit_message(embed=embed, view=None)
-        del self.cog.active_blackjack_games[channel_id]
 
 
 class JackpotView(discord.ui.View):
-    def __init__(self, cog: Games, amount: int):
-        super().__init__(timeout=None)  # No timeout since we handle it in the command
+    def __init__(self, cog: Games):
+        super().__init__(timeout=None)  # No timeout since the scheduler ends the jackpot
         self.cog = cog
-        self.amount = amount
 
-    @discord.ui.button(label="Join Jackpot", style=discord.ButtonStyle.green, emoji="🎰")
+    @discord.ui.button(label="Join Jackpot", style=discord.ButtonStyle.green, emoji="🎰", custom_id="jackpot:join")
     async def join(self, interaction: discord.Interaction, button: discord.ui.Button):
         channel_id = interaction.channel_id
         jackpot = self.cog.active_jackpots.get(channel_id)
@@ -736,9 +991,11 @@ class JackpotView(discord.ui.View):
             await interaction.response.send_message("This jackpot has already ended!", ephemeral=True)
             return
 
-        # Check if user has enough points
-        stats = get_user_stats(interaction.user.id)
-        if stats['points'] < self.amount:
+        amount = jackpot["amount"]
+
+        # Deduct points up front, which fails if the user doesn't have enough,
+        # adding them to the saved contribution in the same transaction
+        if await reserve_contribution(interaction.user.id, amount, "jackpot", channel_id) is None:
             embed = self.cog.create_embed(
                 "Insufficient Points",
                 "You don't have enough points to contribute to the jackpot",
@@ -747,30 +1004,27 @@ class JackpotView(discord.ui.View):
             await interaction.response.send_message(embed=embed, ephemeral=True)
             return
 
-        # Add or update contribution
-        if interaction.user.id in jackpot["contributors"]:
-            # Update existing contribution
-            jackpot["contributors"][interaction.user.id] += self.amount
-        else:
-            # Add new contribution
-            jackpot["contributors"][interaction.user.id] = self.amount
+        # The jackpot may have been drawn while the points were being deducted
+        if self.cog.active_jackpots.get(channel_id) is not jackpot:
+            await refund_contribution(interaction.user.id, amount, "jackpot", channel_id)
+            await interaction.response.send_message("This jackpot has already ended!", ephemeral=True)
+            return
 
-        # Update total amount and deduct points
-        jackpot["total_amount"] += self.amount
-        set_balance(interaction.user.id, stats["points"] - self.amount)
+        # Add or update contribution
+        contribution = jackpot["contributors"].add(interaction.user.id, amount)
+        jackpot["total_amount"] += amount
 
         # Calculate contribution percentage
-        contribution = jackpot["contributors"][interaction.user.id]
-        percentage = (contribution / jackpot["total_amount"]) * 100
+        percentage = jackpot["contributors"].odds(interaction.user.id) * 100
 
         # Update embed
         embed = self.cog.create_embed(
             "🎰 Jackpot Updated",
-            f"**{interaction.user.mention}** contributed **{self.amount:,}** points!\n"
+            f"**{interaction.user.mention}** contributed **{amount:,}** points!\n"
             f"**Total Contribution:** {contribution:,} points ({percentage:.1f}% chance)\n\n"
             f"**Total Jackpot:** {jackpot['total_amount']:,} points\n"
             f"**Participants:** {len(jackpot['contributors'])}\n"
-            f"**Ends:** <t:{int(jackpot['end_time'].timestamp())}:R>\n\n"
+            f"**Ends:** <t:{int(jackpot['end_time'])}:R>\n\n"
             "Click the Join button to contribute more!",
             discord.Color.teal()
         )
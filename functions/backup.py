@@ -0,0 +1,115 @@
+import calendar
+import glob
+import os
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+# Backups are named after the database and the UTC time they were taken
+_STAMP_FORMAT = "%Y%m%d-%H%M%S"
+
+
+def backup_path(database_path: str, directory: str, taken: float) -> str:
+    stem = os.path.splitext(os.path.basename(database_path))[0]
+    return os.path.join(directory, f"{stem}-{time.strftime(_STAMP_FORMAT, time.gmtime(taken))}.db")
+
+
+def list_backups(database_path: str, directory: str) -> List[Tuple[float, str]]:
+    """(time taken, path) of every complete backup, oldest first"""
+    stem = os.path.splitext(os.path.basename(database_path))[0]
+    backups = []
+    for path in glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(stem)}-*.db")):
+        stamp = os.path.basename(path)[len(stem) + 1:-3]
+        try:
+            taken = calendar.timegm(time.strptime(stamp, _STAMP_FORMAT))
+        except ValueError:
+            continue
+        backups.append((taken, path))
+    return sorted(backups)
+
+
+def backup_database(database_path: str, path: str, step_pages: int = -1, step_sleep: float = 0.0) -> int:
+    """
+    Copy a live database to ``path`` with SQLite's backup API, ``step_pages``
+    pages at a time. Returns the number of pages copied.
+
+    The source connection holds one read transaction for the whole copy, so
+    the backup is a snapshot of one moment. Without it, every commit by the
+    bot would restart the copy from the first page. Under WAL that read
+    doesn't block writers, but the WAL can't be reset until the copy ends.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temporary = path + ".part"
+    source = sqlite3.connect(database_path)
+    source.isolation_level = None
+    target = sqlite3.connect(temporary)
+    pages = 0
+
+    def progress(status: int, remaining: int, total: int):
+        nonlocal pages
+        pages = total
+
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1")  # starts the read, pinning the snapshot
+        source.backup(target, pages=step_pages, progress=progress, sleep=step_sleep)
+        source.execute("COMMIT")
+        check = target.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise sqlite3.DatabaseError(f"backup failed its integrity check: {check}")
+        # A copy of a WAL database is still marked WAL; a backup should be one
+        # self-contained file that reading doesn't add -wal and -shm files to
+        target.execute("PRAGMA journal_mode = DELETE")
+    except BaseException:
+        target.close()
+        os.remove(temporary)
+        raise
+    finally:
+        source.close()
+
+    target.close()
+    os.replace(temporary, path)
+    return pages
+
+
+def prune_backups(database_path: str, directory: str, keep: int) -> List[str]:
+    """Delete all but the newest ``keep`` backups, returning the deleted paths"""
+    backups = list_backups(database_path, directory)
+    stale = [path for _, path in backups[:max(len(backups) - keep, 0)]]
+    for path in stale:
+        os.remove(path)
+    return stale
+
+
+def find_backup(database_path: str, directory: str, at: Optional[float] = None) -> Optional[str]:
+    """The newest backup taken at or before ``at`` (any time if None)"""
+    candidates = [path for taken, path in list_backups(database_path, directory) if at is None or taken <= at]
+    return candidates[-1] if candidates else None
+
+
+def restore_backup(path: str, database_path: str) -> str:
+    """
+    Replace the database with a backup; the bot must be stopped first.
+    The current files, WAL included, are moved aside rather than deleted.
+    Returns where they were moved.
+    """
+    source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        check = source.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise sqlite3.DatabaseError(f"{path} failed its integrity check: {check}")
+
+        # A WAL left next to the restored file would be replayed over it
+        aside = f"{database_path}.before-restore-{time.strftime(_STAMP_FORMAT, time.gmtime())}"
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(database_path + suffix):
+                os.replace(database_path + suffix, aside + suffix)
+
+        target = sqlite3.connect(database_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return aside
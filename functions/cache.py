@@ -0,0 +1,61 @@
+from collections import OrderedDict
+
+
+class UserCache:
+    """
+    LRU cache of ``users`` rows keyed by user id.
+
+    Rows are stored as the plain tuples SQLite hands back (roughly 200 bytes
+    each), so ``max_rows`` doubles as the memory cap.
+    """
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self.rows: OrderedDict[int, tuple] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: int):
+        row = self.rows.get(user_id)
+        if row is None:
+            self.misses += 1
+            return None
+        self.rows.move_to_end(user_id)
+        self.hits += 1
+        return row
+
+    def put(self, user_id: int, row: tuple):
+        """Store a row that was just written, replacing whatever was cached"""
+        if self.max_rows <= 0:
+            return
+        self.rows[user_id] = row
+        self.rows.move_to_end(user_id)
+        self._evict()
+
+    def fill(self, user_id: int, row: tuple):
+        """
+        Store a row fetched by a read. A write that finished while the read was
+        in flight has already cached a newer row, so that one is kept.
+        """
+        if self.max_rows <= 0 or user_id in self.rows:
+            return
+        self.rows[user_id] = row
+        self._evict()
+
+    def clear(self):
+        self.rows.clear()
+
+    def _evict(self):
+        while len(self.rows) > self.max_rows:
+            self.rows.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self.rows),
+            'max_rows': self.max_rows,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
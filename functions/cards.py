@@ -0,0 +1,116 @@
+import random
+from typing import Callable, Iterable, MutableSequence, Tuple
+
+# A card is an int from 0 to 51: suit * 13 + rank, with ranks running 2..A.
+# Cards only become strings when an embed is rendered.
+SUITS = ["♠", "♥", "♦", "♣"]
+RANKS = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
+ACE = 12
+DECK = tuple(range(len(SUITS) * len(RANKS)))
+CARD_NAMES = [f"{rank}{suit}" for suit in SUITS for rank in RANKS]
+CARD_IDS = {name: card for card, name in enumerate(CARD_NAMES)}
+
+# A hand's score packs its hard total (aces counted as 1) with a flag for
+# holding an ace: score = hard_total * 2 + has_ace. Adding a card is one
+# table lookup and an OR, and the blackjack value is another lookup.
+CARD_SCORES = bytes(2 * (min(rank + 2, 10) if rank != ACE else 1) for suit in SUITS for rank in range(len(RANKS)))
+CARD_ACE_FLAGS = bytes(int(card % len(RANKS) == ACE) for card in DECK)
+# A player only hits on 21 or less, so no hand goes past a hard 31
+HAND_VALUES = bytes(
+    hard + 10 if has_ace and hard + 10 <= 21 else hard
+    for hard in range(32)
+    for has_ace in (0, 1)
+)
+
+
+def add_card(score: int, card: int) -> int:
+    """A hand's score after drawing ``card``"""
+    return (score + CARD_SCORES[card]) | CARD_ACE_FLAGS[card]
+
+
+def score_hand(hand: Iterable[int]) -> int:
+    """Score a whole hand from scratch"""
+    score = 0
+    for card in hand:
+        score = (score + CARD_SCORES[card]) | CARD_ACE_FLAGS[card]
+    return score
+
+
+def hand_value(score: int) -> int:
+    """The blackjack value of a score, counting an ace as 11 when that doesn't bust"""
+    return HAND_VALUES[score]
+
+
+def card_id(card) -> int:
+    """Accept both encodings, for hands saved before cards were ints"""
+    return CARD_IDS[card] if isinstance(card, str) else card
+
+
+class Shoe:
+    """
+    A blackjack shoe of ``decks`` decks, kept per table.
+
+    Cards sit in a bytearray that is shuffled in place, so dealing a hand
+    allocates nothing. Once the cut card (at ``penetration`` of the shoe) has
+    been dealt the next hand starts from a fresh shuffle. With ``preshuffle``
+    a second buffer is kept shuffled ahead of time and the two are swapped,
+    leaving the caller to run ``shuffle_spare`` whenever it suits. Every
+    shuffle goes through ``shuffle``, so it can draw from a seeded round.
+    """
+
+    __slots__ = ("cards", "spare", "spare_ready", "position", "cut", "shuffle", "shuffles")
+
+    def __init__(self, decks: int = 1, penetration: float = 0.75, preshuffle: bool = False, shuffle: Callable[[MutableSequence], None] = random.shuffle):
+        self.cards = bytearray(DECK * decks)
+        self.cut = int(len(self.cards) * penetration)
+        self.spare = bytearray(self.cards) if preshuffle else None
+        self.spare_ready = False
+        self.shuffle = shuffle
+        self.shuffle(self.cards)
+        self.position = 0
+        self.shuffles = 0
+        if preshuffle:
+            self.shuffle_spare()
+
+    @property
+    def past_cut_card(self) -> bool:
+        return self.position >= self.cut
+
+    @property
+    def needs_spare(self) -> bool:
+        return self.spare is not None and not self.spare_ready
+
+    def draw(self) -> int:
+        # A crowded table can run through the cards left behind the cut card
+        if self.position == len(self.cards):
+            self.reshuffle()
+        card = self.cards[self.position]
+        self.position += 1
+        return card
+
+    def reshuffle(self):
+        if self.spare_ready:
+            self.cards, self.spare = self.spare, self.cards
+            self.spare_ready = False
+        else:
+            self.shuffle(self.cards)
+        self.position = 0
+        self.shuffles += 1
+
+    def mark(self) -> Tuple[int, int]:
+        """Where the shoe is; pass it to ``undraw`` to put back what was drawn up to here"""
+        return self.shuffles, self.position
+
+    def undraw(self, mark: Tuple[int, int], count: int) -> bool:
+        """
+        Put the last ``count`` cards back on top, if nothing was drawn or
+        shuffled since ``mark`` was taken. Returns whether they went back.
+        """
+        if mark != (self.shuffles, self.position) or self.position < count:
+            return False
+        self.position -= count
+        return True
+
+    def shuffle_spare(self):
+        self.shuffle(self.spare)
+        self.spare_ready = True
@@ -1,136 +1,1054 @@
+import asyncio
+import calendar
+import json
+import os
+import queue
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
-
+import config
 from config import DATABASE_PATH
+from functions.backup import backup_database, backup_path, prune_backups
+from functions.cache import UserCache
+from functions.ranking import RankIndex
+
+# Number of long-lived read connections. Writes always go through a single
+# writer thread so SQLite never has to arbitrate between our own connections.
+READER_POOL_SIZE = getattr(config, "DATABASE_READERS", 4)
+# Group commit: the writer keeps collecting queued writes for up to
+# COMMIT_WINDOW seconds (or MAX_BATCH_SIZE writes) and commits them together.
+COMMIT_WINDOW = getattr(config, "DATABASE_COMMIT_WINDOW", 0.002)
+MAX_BATCH_SIZE = getattr(config, "DATABASE_MAX_BATCH", 256)
+
+# Storage profiles applied to every connection we open. "wal" lets /stats
+# readers run alongside settlement writes; "default" keeps SQLite's own
+# rollback journal settings. Individual pragmas can be overridden with
+# DATABASE_PRAGMAS in config.
+STORAGE_PROFILES = {
+    "default": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,  # negative means KiB
+        "wal_autocheckpoint": 1000,
+        "checkpoint_interval": 300,  # seconds between background checkpoints
+        "checkpoint_mode": "PASSIVE",
+    },
+}
+STORAGE_PROFILE = {
+    **STORAGE_PROFILES[getattr(config, "DATABASE_PROFILE", "wal")],
+    **getattr(config, "DATABASE_PRAGMAS", {}),
+}
+
+# Write-through cache of user rows so balance checks don't need a SELECT
+USER_CACHE_SIZE = getattr(config, "USER_CACHE_SIZE", 100_000)
+# Keep every user's balance ranked in memory (roughly 90 bytes a user) so
+# /rank and leaderboard pages skip SQL; without it they use the points index
+LEADERBOARD_INDEX = getattr(config, "LEADERBOARD_INDEX", True)
+
+# Every balance change is appended to the ledger in the same transaction.
+# Snapshots of the balances that changed are taken every
+# LEDGER_SNAPSHOT_INTERVAL seconds, so a past balance is a snapshot plus a
+# short sum. Rows older than LEDGER_RETENTION_DAYS are moved out to monthly
+# archive files next to the database (0 keeps everything).
+LEDGER_SNAPSHOT_INTERVAL = getattr(config, "LEDGER_SNAPSHOT_INTERVAL", 3600)
+LEDGER_RETENTION_DAYS = getattr(config, "LEDGER_RETENTION_DAYS", 90)
+LEDGER_ARCHIVE_PATH = getattr(
+    config, "LEDGER_ARCHIVE_PATH", os.path.splitext(DATABASE_PATH)[0] + "-ledger-{month}.db"
+)
+_LEDGER_CHUNK_SIZE = 10_000  # rows moved per write transaction when rotating
+
+# Ledger entry kinds
+LEDGER_BET = 1  # stake held by reserve_bet
+LEDGER_PAYOUT = 2
+LEDGER_REFUND = 3
+LEDGER_TRANSFER = 4  # ref is the other user
+LEDGER_DEPOSIT = 5
+LEDGER_ADMIN = 6
+
+# Online backups: every BACKUP_INTERVAL seconds (0 turns them off) the live
+# database is copied into BACKUP_DIR, BACKUP_STEP_PAGES pages at a time with
+# a short pause between steps, and only the newest BACKUP_KEEP are kept
+BACKUP_DIR = getattr(config, "BACKUP_DIR", "databases/backups")
+BACKUP_INTERVAL = getattr(config, "BACKUP_INTERVAL", 6 * 3600)
+BACKUP_KEEP = getattr(config, "BACKUP_KEEP", 8)
+BACKUP_STEP_PAGES = getattr(config, "BACKUP_STEP_PAGES", 1024)
+BACKUP_STEP_SLEEP = getattr(config, "BACKUP_STEP_SLEEP", 0.005)
+
+_USER_COLUMNS = "points, wins, losses, draws, total_games, CAST(win_rate AS REAL)"
+_RETURNING_USER = "RETURNING " + _USER_COLUMNS
+_SQL_CHUNK_SIZE = 500  # ids per IN (...) query, well under SQLite's variable limit
+_DEFAULT_USER = (0, 0, 0, 0, 0, 0.0)
+_CONNECTION_PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "mmap_size", "cache_size", "wal_autocheckpoint")
+
+_write_queue = queue.SimpleQueue()
+_writer_thread = None
+_readers = ThreadPoolExecutor(max_workers=READER_POOL_SIZE, thread_name_prefix="db-reader")
+# Its own thread, so a long backup never holds up a reader and two never overlap
+_backups = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-backup")
+_local = threading.local()
+_checkpoint_task = None
+_ledger_task = None
+_backup_task = None
+_user_cache = UserCache(USER_CACHE_SIZE)
+_rankings: Optional[RankIndex] = None  # set by load_leaderboard
+# Which bot process this is when running as several clusters; scheduled
+# events and game sessions belong to the process whose shards created them
+_cluster_id = 0
+_clustered = False
+
 
 def db_connection():
-    connection = sqlite3.connect(database=DATABASE_PATH)
+    connection = sqlite3.connect(database=DATABASE_PATH, check_same_thread=False)
+    for pragma in _CONNECTION_PRAGMAS:
+        if pragma in STORAGE_PROFILE:
+            connection.execute(f"PRAGMA {pragma} = {STORAGE_PROFILE[pragma]}")
     return connection
 
-def setup_tables():
-    with db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY NOT NULL,
-                points INTEGER NOT NULL DEFAULT 0,
-                wins INTEGER NOT NULL DEFAULT 0,
-                losses INTEGER NOT NULL DEFAULT 0,
-                draws INTEGER NOT NULL DEFAULT 0,
-                total_games INTEGER NOT NULL DEFAULT 0,
-                win_rate FLOAT NOT NULL DEFAULT 0.0
-            )
-            """
-        )
+def _thread_connection() -> sqlite3.Connection:
+    """Return the connection owned by the current pool thread, opening it on first use"""
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = db_connection()
+        _local.connection = connection
+    return connection
 
-        cursor.close()
+def _next_batch():
+    """Block for the next write, then gather whatever else arrives within the commit window"""
+    item = _write_queue.get()
+    if item is None:
+        return None
 
-def ensure_user_exists(user_id: int):
-    with db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("INSERT OR IGNORE INTO users (id) VALUES (?)", (user_id,))
-        conn.commit()
-        cursor.close()
+    batch = [item]
+    # Sleep through the window and then drain, rather than a get with a
+    # millisecond timeout: on some kernels that wait can miss its wakeup and
+    # block until the next write arrives, which a quiet bot may never send
+    if COMMIT_WINDOW > 0:
+        time.sleep(COMMIT_WINDOW)
+    while len(batch) < MAX_BATCH_SIZE:
+        try:
+            item = _write_queue.get_nowait()
+        except queue.Empty:
+            break
+        if item is None:
+            # Commit what we have, then stop on the next pass
+            _write_queue.put(None)
+            break
+        batch.append(item)
+    return batch
 
-def set_balance(user_id: int, amount: int):
-    ensure_user_exists(user_id)
-    with db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET points = ? WHERE id = ?", (amount, user_id))
-        conn.commit()
-        cursor.close()
+def _resolve(future: asyncio.Future, ok: bool, value):
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
 
-def add_balance(user_id: int, amount: int):
-    ensure_user_exists(user_id)
-    with db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET points = points + ? WHERE id = ?", (amount, user_id))
-        conn.commit()
+def _commit_batch(connection: sqlite3.Connection, batch: list):
+    """Apply a batch of writes in one transaction; each write gets its own savepoint
+    so a failing write is rolled back without taking the rest of the batch with it"""
+    cursor = connection.cursor()
+    results = []
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        for func, args, _, _ in batch:
+            cursor.execute("SAVEPOINT write")
+            try:
+                results.append((True, func(cursor, *args)))
+            except Exception as error:
+                cursor.execute("ROLLBACK TO write")
+                results.append((False, error))
+            cursor.execute("RELEASE write")
+        cursor.execute("COMMIT")
+    except Exception as error:
+        if connection.in_transaction:
+            connection.rollback()
+        results = [(False, error)] * len(batch)
+    finally:
         cursor.close()
 
-def remove_win_rate(user_id: int):
-    ensure_user_exists(user_id)
-    with db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET win_rate = 0.0 WHERE id = ?", (user_id,))
-        conn.commit()
-        cursor.close()
+    # Only wake the callers once the batch is durable
+    for (_, _, loop, future), (ok, value) in zip(batch, results):
+        loop.call_soon_threadsafe(_resolve, future, ok, value)
 
-def set_wins(user_id: int, wins: int):
-    ensure_user_exists(user_id)
-    with db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET wins = ? WHERE id = ?", (wins, user_id))
-        cursor.execute("UPDATE users SET total_games = wins + losses + draws WHERE id = ?", (user_id,))
-        cursor.execute("UPDATE users SET win_rate = CASE WHEN total_games > 0 THEN (wins * 100.0) / total_games ELSE 0 END WHERE id = ?", (user_id,))
-        conn.commit()
-        cursor.close()
+def _writer_loop():
+    connection = db_connection()
+    connection.isolation_level = None  # transactions are managed by _commit_batch
+    try:
+        while (batch := _next_batch()) is not None:
+            _commit_batch(connection, batch)
+    finally:
+        connection.close()
 
-def set_losses(user_id: int, losses: int):
-    ensure_user_exists(user_id)
-    with db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET losses = ? WHERE id = ?", (losses, user_id))
-        cursor.execute("UPDATE users SET total_games = wins + losses + draws WHERE id = ?", (user_id,))
-        cursor.execute("UPDATE users SET win_rate = CASE WHEN total_games > 0 THEN (wins * 100.0) / total_games ELSE 0 END WHERE id = ?", (user_id,))
-        conn.commit()
+def _run_read(func, *args):
+    cursor = _thread_connection().cursor()
+    try:
+        return func(cursor, *args)
+    finally:
         cursor.close()
 
-def adjust_win_rate(user_id: int, percentage: float):
-    ensure_user_exists(user_id)
-    with db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET win_rate = ? WHERE id = ?", (percentage, user_id))
-        conn.commit()
-        cursor.close()
+async def _write(func, *args):
+    """Queue ``func(cursor, *args)`` for the writer thread and wait until it is committed"""
+    global _writer_thread
+    if _writer_thread is None or not _writer_thread.is_alive():
+        _writer_thread = threading.Thread(target=_writer_loop, name="db-writer", daemon=True)
+        _writer_thread.start()
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    _write_queue.put((func, args, loop, future))
+    return await future
+
+async def _read(func, *args):
+    """Run ``func(cursor, *args)`` on one of the pooled reader connections"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_readers, _run_read, func, *args)
+
+def _checkpoint(cursor: sqlite3.Cursor, mode: str):
+    cursor.execute(f"PRAGMA wal_checkpoint({mode})")
+    return cursor.fetchone()
+
+async def checkpoint(mode: str = "PASSIVE"):
+    """Checkpoint the WAL from a reader thread so the event loop never waits on it"""
+    return await _read(_checkpoint, mode)
+
+async def _checkpoint_loop(interval: float, mode: str):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await checkpoint(mode)
+        except sqlite3.Error as error:
+            print(f"🟥 | WAL checkpoint failed: {error}")
+
+def start_checkpoints():
+    """Start the periodic WAL checkpoint task for the current profile, once"""
+    global _checkpoint_task
+    interval = STORAGE_PROFILE.get("checkpoint_interval")
+    if str(STORAGE_PROFILE.get("journal_mode", "")).upper() != "WAL" or not interval:
+        return
+    if _checkpoint_task is None or _checkpoint_task.done():
+        _checkpoint_task = asyncio.create_task(
+            _checkpoint_loop(interval, STORAGE_PROFILE.get("checkpoint_mode", "PASSIVE"))
+        )
+
+def set_cluster(cluster_id: int):
+    """
+    Run as one process of a multi-process deployment. Balances stay consistent
+    across processes because every change is a single conditional SQL
+    statement, but the row cache can't see other processes' writes, so it is
+    turned off, as is the in-memory leaderboard.
+    """
+    global _cluster_id, _clustered, _rankings
+    _cluster_id = cluster_id
+    _clustered = True
+    _user_cache.max_rows = 0
+    _user_cache.clear()
+    _rankings = None
+
+def close_connections():
+    """Flush pending writes and shut down the pool threads"""
+    if _writer_thread is not None:
+        _write_queue.put(None)
+        _writer_thread.join()
+    _readers.shutdown(wait=True)
+    _backups.shutdown(wait=True)
+
+
+def _add_column(cursor: sqlite3.Cursor, table: str, column: str, definition: str):
+    """Bring a table created by an older version up to date"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in (row[1] for row in cursor.fetchall()):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _setup_tables(cursor: sqlite3.Cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY NOT NULL,
+            points INTEGER NOT NULL DEFAULT 0,
+            wins INTEGER NOT NULL DEFAULT 0,
+            losses INTEGER NOT NULL DEFAULT 0,
+            draws INTEGER NOT NULL DEFAULT 0,
+            total_games INTEGER NOT NULL DEFAULT 0,
+            win_rate FLOAT NOT NULL DEFAULT 0.0
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scheduled_events (
+            id INTEGER PRIMARY KEY NOT NULL,
+            due REAL NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            cluster INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS game_sessions (
+            kind TEXT NOT NULL,
+            channel_id INTEGER NOT NULL,
+            key INTEGER NOT NULL,
+            state TEXT NOT NULL,
+            cluster INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, channel_id, key)
+        ) WITHOUT ROWID
+        """
+    )
+    _add_column(cursor, "scheduled_events", "cluster", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(cursor, "game_sessions", "cluster", "INTEGER NOT NULL DEFAULT 0")
+    # Leaderboard order; ties fall back to the rowid, i.e. the user id
+    cursor.execute("CREATE INDEX IF NOT EXISTS users_points ON users (points DESC)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS users_win_rate ON users (win_rate DESC)")
+    _setup_ledger_tables(cursor)
+    # One row per completed snapshot run: every balance that changed up to
+    # ledger_id has a snapshot at or after the previous run
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS snapshot_runs (
+            ledger_id INTEGER PRIMARY KEY NOT NULL,
+            time INTEGER NOT NULL
+        )
+        """
+    )
+
+def _setup_ledger_tables(cursor: sqlite3.Cursor):
+    """Also run against each archive file, which holds the same two tables"""
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ledger (
+            id INTEGER PRIMARY KEY NOT NULL,
+            user_id INTEGER NOT NULL,
+            kind INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            time INTEGER NOT NULL,
+            ref INTEGER
+        )
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS balance_snapshots (
+            user_id INTEGER NOT NULL,
+            ledger_id INTEGER NOT NULL,
+            time INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            PRIMARY KEY (user_id, ledger_id)
+        ) WITHOUT ROWID
+        """
+    )
+    # An index carries the rowid, so this also orders a user's entries by id
+    cursor.execute("CREATE INDEX IF NOT EXISTS ledger_user ON ledger (user_id)")
+
+async def setup_tables():
+    await _write(_setup_tables)
+
+def _remember(user_id: int, row: tuple):
+    """Pass a freshly written user row on to the cache and the leaderboard"""
+    _user_cache.put(user_id, row)
+    if _rankings is not None:
+        _rankings.update(user_id, row[0])
+
+_LOG_ENTRY = "INSERT INTO ledger (user_id, kind, delta, time, ref) VALUES (?, ?, ?, ?, ?)"
+
+def _log(cursor: sqlite3.Cursor, user_id: int, kind: int, delta: int, ref: Optional[int] = None):
+    """Append a balance change to the ledger; called inside the write that makes it"""
+    if delta:
+        cursor.execute(_LOG_ENTRY, (user_id, kind, delta, int(time.time()), ref))
+
+def _set_balance(cursor: sqlite3.Cursor, user_id: int, amount: int):
+    cursor.execute("SELECT points FROM users WHERE id = ?", (user_id,))
+    old = cursor.fetchone()
+    _log(cursor, user_id, LEDGER_ADMIN, amount - (old[0] if old else 0))
+    cursor.execute(
+        "INSERT INTO users (id, points) VALUES (?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET points = excluded.points " + _RETURNING_USER,
+        (user_id, amount)
+    )
+    return cursor.fetchone()
+
+async def set_balance(user_id: int, amount: int):
+    _remember(user_id, await _write(_set_balance, user_id, amount))
+
+def _add_balance(cursor: sqlite3.Cursor, user_id: int, amount: int, kind: int = LEDGER_ADMIN, ref: Optional[int] = None):
+    _log(cursor, user_id, kind, amount, ref)
+    cursor.execute(
+        "INSERT INTO users (id, points) VALUES (?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET points = points + excluded.points " + _RETURNING_USER,
+        (user_id, amount)
+    )
+    return cursor.fetchone()
+
+async def add_balance(user_id: int, amount: int, kind: int = LEDGER_ADMIN):
+    """Credit a user; ``kind`` is how the change is recorded in the ledger"""
+    _remember(user_id, await _write(_add_balance, user_id, amount, kind))
+
+def _remove_win_rate(cursor: sqlite3.Cursor, user_id: int):
+    cursor.execute(
+        "INSERT INTO users (id) VALUES (?) "
+        "ON CONFLICT(id) DO UPDATE SET win_rate = 0.0 " + _RETURNING_USER,
+        (user_id,)
+    )
+    return cursor.fetchone()
+
+async def remove_win_rate(user_id: int):
+    _remember(user_id, await _write(_remove_win_rate, user_id))
+
+def _set_wins(cursor: sqlite3.Cursor, user_id: int, wins: int):
+    cursor.execute(
+        """
+        INSERT INTO users (id, wins, total_games, win_rate)
+        VALUES (?1, ?2, ?2, CASE WHEN ?2 > 0 THEN 100.0 ELSE 0 END)
+        ON CONFLICT(id) DO UPDATE SET
+            wins = excluded.wins,
+            total_games = excluded.wins + losses + draws,
+            win_rate = CASE WHEN excluded.wins + losses + draws > 0
+                THEN (excluded.wins * 100.0) / (excluded.wins + losses + draws) ELSE 0 END
+        """ + _RETURNING_USER,
+        (user_id, wins)
+    )
+    return cursor.fetchone()
+
+async def set_wins(user_id: int, wins: int):
+    _remember(user_id, await _write(_set_wins, user_id, wins))
+
+def _set_losses(cursor: sqlite3.Cursor, user_id: int, losses: int):
+    cursor.execute(
+        """
+        INSERT INTO users (id, losses, total_games)
+        VALUES (?1, ?2, ?2)
+        ON CONFLICT(id) DO UPDATE SET
+            losses = excluded.losses,
+            total_games = wins + excluded.losses + draws,
+            win_rate = CASE WHEN wins + excluded.losses + draws > 0
+                THEN (wins * 100.0) / (wins + excluded.losses + draws) ELSE 0 END
+        """ + _RETURNING_USER,
+        (user_id, losses)
+    )
+    return cursor.fetchone()
+
+async def set_losses(user_id: int, losses: int):
+    _remember(user_id, await _write(_set_losses, user_id, losses))
+
+def _adjust_win_rate(cursor: sqlite3.Cursor, user_id: int, percentage: float):
+    cursor.execute(
+        "INSERT INTO users (id, win_rate) VALUES (?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET win_rate = excluded.win_rate " + _RETURNING_USER,
+        (user_id, percentage)
+    )
+    return cursor.fetchone()
+
+async def adjust_win_rate(user_id: int, percentage: float):
+    _remember(user_id, await _write(_adjust_win_rate, user_id, percentage))
+
+def _get_user_row(cursor: sqlite3.Cursor, user_id: int):
+    cursor.execute(
+        """
+        SELECT points, wins, losses, draws, total_games, win_rate
+        FROM users
+        WHERE id = ?
+        """,
+        (user_id,)
+    )
+    # Users only get a row on their first write; until then they have the column defaults
+    return cursor.fetchone() or _DEFAULT_USER
+
+async def get_user_stats(user_id: int):
+    stats = _user_cache.get(user_id)
+    if stats is None:
+        stats = await _read(_get_user_row, user_id)
+        _user_cache.fill(user_id, stats)
+    return {
+        'points': stats[0],
+        'wins': stats[1],
+        'losses': stats[2],
+        'draws': stats[3],
+        'total_games': stats[4],
+        'win_rate': stats[5]
+    }
+
+def cache_stats() -> dict:
+    """Hit/miss/eviction counters for the user row cache"""
+    return _user_cache.stats()
+
+def _get_all_points(cursor: sqlite3.Cursor):
+    cursor.execute("SELECT id, points FROM users")
+    return cursor.fetchall()
+
+async def load_leaderboard():
+    """Build the in-memory leaderboard; run at startup, before any cog can write"""
+    global _rankings
+    if not LEADERBOARD_INDEX or _clustered:
+        return
+    _rankings = RankIndex(await _read(_get_all_points))
+
+def _get_leaderboard(cursor: sqlite3.Cursor, column: str, count: int, offset: int):
+    cursor.execute(f"SELECT id, {column} FROM users ORDER BY {column} DESC, id LIMIT ? OFFSET ?", (count, offset))
+    return cursor.fetchall()
+
+async def get_leaderboard(count: int, offset: int = 0, by: str = "points") -> List[Tuple[int, float]]:
+    """
+    A page of the leaderboard as (user_id, value) pairs, highest first
+    ``by`` is "points" or "win_rate"
+    """
+    if by not in ("points", "win_rate"):
+        raise ValueError(f"can't rank users by {by}")
+    if by == "points" and _rankings is not None:
+        return _rankings.top(count, offset)
+    return await _read(_get_leaderboard, by, count, offset)
+
+def _get_rank(cursor: sqlite3.Cursor, points: int):
+    cursor.execute("SELECT COUNT(*) FROM users WHERE points > ?", (points,))
+    above = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM users")
+    return above + 1, cursor.fetchone()[0]
+
+async def get_rank(user_id: int) -> Tuple[int, int]:
+    """A user's place on the points leaderboard and how many users are ranked"""
+    points = (await get_user_stats(user_id))['points']
+    if _rankings is not None:
+        return _rankings.rank(points), len(_rankings)
+    return await _read(_get_rank, points)
+
+def _reserve_bet(cursor: sqlite3.Cursor, user_id: int, amount: int, kind: int = LEDGER_BET, ref: Optional[int] = None):
+    # The balance check and the debit are one statement, so concurrent bets can't overdraw
+    cursor.execute(
+        "UPDATE users SET points = points - ?1 WHERE id = ?2 AND points >= ?1 " + _RETURNING_USER,
+        (amount, user_id)
+    )
+    row = cursor.fetchone()
+    if row is not None:
+        _log(cursor, user_id, kind, -amount, ref)
+    return row
+
+async def reserve_bet(user_id: int, amount: int) -> Optional[int]:
+    """
+    Hold a bet's stake by taking it out of the user's balance up front
+    Returns the balance left after the hold, or None if the user doesn't have enough points
+    """
+    cached = _user_cache.get(user_id)
+    if cached is not None and cached[0] < amount:
+        return None
+
+    row = await _write(_reserve_bet, user_id, amount)
+    if row is None:
+        return None
+    _remember(user_id, row)
+    return row[0]
+
+# Pays out a settled bet and counts its outcome in one upsert, so /stats never
+# needs a second statement. Parameters: id, payout, wins, losses, draws.
+_SETTLE_BET = """
+    INSERT INTO users (id, points, wins, losses, draws, total_games, win_rate)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?3 + ?4 + ?5, CASE WHEN ?3 + ?4 + ?5 > 0 THEN ?3 * 100.0 / (?3 + ?4 + ?5) ELSE 0 END)
+    ON CONFLICT(id) DO UPDATE SET
+        points = points + excluded.points,
+        wins = wins + excluded.wins,
+        losses = losses + excluded.losses,
+        draws = draws + excluded.draws,
+        total_games = total_games + excluded.total_games,
+        win_rate = CASE WHEN excluded.total_games > 0
+            THEN (wins + excluded.wins) * 100.0 / (total_games + excluded.total_games) ELSE win_rate END
+"""
+
+def _settlement(user_id: int, payout: int, stake: Optional[int]) -> Tuple[int, int, int, int, int]:
+    """Parameters for _SETTLE_BET; more than the stake back is a win, the stake alone a draw"""
+    if stake is None:
+        return user_id, payout, 0, 0, 0
+    return user_id, payout, int(payout > stake), int(payout < stake), int(payout == stake)
+
+def _settle_bet(cursor: sqlite3.Cursor, user_id: int, payout: int, stake: Optional[int], kind: int = LEDGER_PAYOUT):
+    _log(cursor, user_id, kind, payout)
+    cursor.execute(_SETTLE_BET + _RETURNING_USER, _settlement(user_id, payout, stake))
+    return cursor.fetchone()
+
+async def settle_bet(user_id: int, payout: int, stake: Optional[int] = None) -> int:
+    """
+    Settle a bet held by reserve_bet; payout includes the returned stake and is 0 for a loss
+    With the stake, the game also counts as a win, loss or draw in the user's stats
+    Returns the user's new balance
+    """
+    row = await _write(_settle_bet, user_id, payout, stake)
+    _remember(user_id, row)
+    return row[0]
+
+async def refund_bet(user_id: int, amount: int) -> int:
+    """Give a held stake back when a game is abandoned; it doesn't count as a game"""
+    row = await _write(_settle_bet, user_id, amount, None, LEDGER_REFUND)
+    _remember(user_id, row)
+    return row[0]
+
+def _settle_bets(cursor: sqlite3.Cursor, payouts: List[Tuple[int, int, Optional[int]]], ledger_kind: int = LEDGER_PAYOUT):
+    cursor.executemany(_SETTLE_BET, [_settlement(*payout) for payout in payouts])
+    now = int(time.time())
+    cursor.executemany(
+        _LOG_ENTRY,
+        [(user_id, ledger_kind, payout, now, None) for user_id, payout, _ in payouts if payout]
+    )
 
-def get_user_stats(user_id: int):
-    ensure_user_exists(user_id)
-    with db_connection() as conn:
-        cursor = conn.cursor()
+    # executemany can't hand back RETURNING rows, so read the new rows in the same transaction
+    user_ids = list({payout[0] for payout in payouts})
+    rows = {}
+    for start in range(0, len(user_ids), _SQL_CHUNK_SIZE):
+        chunk = user_ids[start:start + _SQL_CHUNK_SIZE]
         cursor.execute(
-            """
-            SELECT points, wins, losses, draws, total_games, win_rate 
-            FROM users 
-            WHERE id = ?
-            """,
-            (user_id,)
+            f"SELECT id, {_USER_COLUMNS} FROM users WHERE id IN ({', '.join('?' * len(chunk))})",
+            chunk
         )
-        stats = cursor.fetchone()
-        cursor.close()
-        return {
-            'points': stats[0],
-            'wins': stats[1],
-            'losses': stats[2],
-            'draws': stats[3],
-            'total_games': stats[4],
-            'win_rate': stats[5]
-        }
+        rows.update((row[0], row[1:]) for row in cursor.fetchall())
+    return rows
+
+def _transfer_points(cursor: sqlite3.Cursor, from_user_id: int, to_user_id: int, amount: int):
+    sender = _reserve_bet(cursor, from_user_id, amount, LEDGER_TRANSFER, to_user_id)
+    if sender is None:
+        return None
+
+    return sender, _add_balance(cursor, to_user_id, amount, LEDGER_TRANSFER, from_user_id)
 
-def transfer_points(from_user_id: int, to_user_id: int, amount: int) -> bool:
+async def transfer_points(from_user_id: int, to_user_id: int, amount: int) -> bool:
     """
     Transfer points from one user to another
     Returns True if transfer was successful, False if sender doesn't have enough points
     """
-    ensure_user_exists(from_user_id)
-    ensure_user_exists(to_user_id)
-    
-    with db_connection() as conn:
-        cursor = conn.cursor()
-        
-        # Check if sender has enough points
-        cursor.execute("SELECT points FROM users WHERE id = ?", (from_user_id,))
-        sender_points = cursor.fetchone()[0]
-        
-        if sender_points < amount:
-            cursor.close()
-            return False
-            
-        # Perform the transfer
-        cursor.execute("UPDATE users SET points = points - ? WHERE id = ?", (amount, from_user_id))
-        cursor.execute("UPDATE users SET points = points + ? WHERE id = ?", (amount, to_user_id))
-        
-        conn.commit()
-        cursor.close()
-        return True
\ No newline at end of file
+    rows = await _write(_transfer_points, from_user_id, to_user_id, amount)
+    if rows is None:
+        return False
+
+    _remember(from_user_id, rows[0])
+    _remember(to_user_id, rows[1])
+    return True
+
+def _add_scheduled_event(cursor: sqlite3.Cursor, kind: str, due: float, payload: str) -> int:
+    cursor.execute(
+        "INSERT INTO scheduled_events (due, kind, payload, cluster) VALUES (?, ?, ?, ?)",
+        (due, kind, payload, _cluster_id)
+    )
+    return cursor.lastrowid
+
+async def add_scheduled_event(kind: str, due: float, payload: str) -> int:
+    return await _write(_add_scheduled_event, kind, due, payload)
+
+def _delete_scheduled_event(cursor: sqlite3.Cursor, event_id: int):
+    cursor.execute("DELETE FROM scheduled_events WHERE id = ?", (event_id,))
+
+async def delete_scheduled_event(event_id: int):
+    await _write(_delete_scheduled_event, event_id)
+
+def _get_scheduled_events(cursor: sqlite3.Cursor, kinds: List[str]):
+    cursor.execute(
+        f"SELECT id, due, kind, payload FROM scheduled_events "
+        f"WHERE cluster = ? AND kind IN ({', '.join('?' * len(kinds))})",
+        [_cluster_id, *kinds]
+    )
+    return cursor.fetchall()
+
+async def get_scheduled_events(kinds: List[str]) -> List[Tuple[int, float, str, str]]:
+    """Pending events of the given kinds as (id, due, kind, payload) rows"""
+    return await _read(_get_scheduled_events, kinds)
+
+def _save_game_session(cursor: sqlite3.Cursor, kind: str, channel_id: int, key: int, state: str):
+    cursor.execute(
+        "INSERT INTO game_sessions (kind, channel_id, key, state, cluster) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(kind, channel_id, key) DO UPDATE SET state = excluded.state",
+        (kind, channel_id, key, state, _cluster_id)
+    )
+
+async def save_game_session(kind: str, channel_id: int, state: dict):
+    """Snapshot the scalar part of an active game (key 0 of the session)"""
+    await _write(_save_game_session, kind, channel_id, 0, json.dumps(state, separators=(",", ":")))
+
+async def save_game_session_entry(kind: str, channel_id: int, key: int, value):
+    """
+    Snapshot one entry of a game that grows as players join (a roulette bet,
+    a jackpot contribution), so a join rewrites one small row, not the whole game
+    """
+    await _write(_save_game_session, kind, channel_id, key, json.dumps(value, separators=(",", ":")))
+
+def _delete_game_session(cursor: sqlite3.Cursor, kind: str, channel_id: int):
+    cursor.execute("DELETE FROM game_sessions WHERE kind = ? AND channel_id = ?", (kind, channel_id))
+
+async def delete_game_session(kind: str, channel_id: int):
+    await _write(_delete_game_session, kind, channel_id)
+
+def _delete_game_session_entry(cursor: sqlite3.Cursor, kind: str, channel_id: int, key: int):
+    cursor.execute(
+        "DELETE FROM game_sessions WHERE kind = ? AND channel_id = ? AND key = ?",
+        (kind, channel_id, key)
+    )
+
+async def delete_game_session_entry(kind: str, channel_id: int, key: int):
+    await _write(_delete_game_session_entry, kind, channel_id, key)
+
+# A jackpot entry is the player's running contribution, so joins add to it
+# in SQL instead of writing a total that a concurrent join could overwrite
+_ADD_TO_SESSION_ENTRY = """
+    INSERT INTO game_sessions (kind, channel_id, key, state, cluster) VALUES (?1, ?2, ?3, ?4, ?5)
+    ON CONFLICT(kind, channel_id, key) DO UPDATE SET state = CAST(state AS INTEGER) + ?4
+"""
+
+# The functions below pair a balance change with the session write that
+# tracks it in one transaction, so a crash between the two can't leave a
+# stake held with nothing to return it, or a settled game that restores.
+
+def _reserve_bet_entry(cursor: sqlite3.Cursor, user_id: int, amount: int, kind: str, channel_id: int, state: str):
+    row = _reserve_bet(cursor, user_id, amount)
+    if row is not None:
+        _save_game_session(cursor, kind, channel_id, user_id, state)
+    return row
+
+async def reserve_bet_entry(user_id: int, amount: int, kind: str, channel_id: int, value) -> Optional[int]:
+    """reserve_bet that also saves the player's session entry (a roulette bet) if the hold succeeds"""
+    cached = _user_cache.get(user_id)
+    if cached is not None and cached[0] < amount:
+        return None
+
+    row = await _write(_reserve_bet_entry, user_id, amount, kind, channel_id, json.dumps(value, separators=(",", ":")))
+    if row is None:
+        return None
+    _remember(user_id, row)
+    return row[0]
+
+def _reserve_contribution(cursor: sqlite3.Cursor, user_id: int, amount: int, kind: str, channel_id: int):
+    row = _reserve_bet(cursor, user_id, amount)
+    if row is not None:
+        cursor.execute(_ADD_TO_SESSION_ENTRY, (kind, channel_id, user_id, amount, _cluster_id))
+    return row
+
+async def reserve_contribution(user_id: int, amount: int, kind: str, channel_id: int) -> Optional[int]:
+    """reserve_bet that also adds the stake to the player's session entry (a jackpot contribution)"""
+    cached = _user_cache.get(user_id)
+    if cached is not None and cached[0] < amount:
+        return None
+
+    row = await _write(_reserve_contribution, user_id, amount, kind, channel_id)
+    if row is None:
+        return None
+    _remember(user_id, row)
+    return row[0]
+
+def _refund_contribution(cursor: sqlite3.Cursor, user_id: int, amount: int, kind: str, channel_id: int):
+    row = _settle_bet(cursor, user_id, amount, None, LEDGER_REFUND)
+    cursor.execute(
+        "UPDATE game_sessions SET state = CAST(state AS INTEGER) - ? WHERE kind = ? AND channel_id = ? AND key = ?",
+        (amount, kind, channel_id, user_id)
+    )
+    cursor.execute(
+        "DELETE FROM game_sessions WHERE kind = ? AND channel_id = ? AND key = ? AND CAST(state AS INTEGER) <= 0",
+        (kind, channel_id, user_id)
+    )
+    return row
+
+async def refund_contribution(user_id: int, amount: int, kind: str, channel_id: int) -> int:
+    """Undo reserve_contribution, e.g. when the jackpot was drawn while the hold was written"""
+    row = await _write(_refund_contribution, user_id, amount, kind, channel_id)
+    _remember(user_id, row)
+    return row[0]
+
+def _settle_bet_entry(cursor: sqlite3.Cursor, user_id: int, payout: int, stake: Optional[int], kind: str, channel_id: int, ledger_kind: int):
+    row = _settle_bet(cursor, user_id, payout, stake, ledger_kind)
+    _delete_game_session_entry(cursor, kind, channel_id, user_id)
+    return row
+
+async def settle_bet_entry(user_id: int, payout: int, stake: int, kind: str, channel_id: int) -> int:
+    """settle_bet that also deletes the player's session entry (a blackjack hand)"""
+    row = await _write(_settle_bet_entry, user_id, payout, stake, kind, channel_id, LEDGER_PAYOUT)
+    _remember(user_id, row)
+    return row[0]
+
+async def refund_bet_entry(user_id: int, amount: int, kind: str, channel_id: int) -> int:
+    """refund_bet that also deletes the player's session entry"""
+    row = await _write(_settle_bet_entry, user_id, amount, None, kind, channel_id, LEDGER_REFUND)
+    _remember(user_id, row)
+    return row[0]
+
+def _settle_session(cursor: sqlite3.Cursor, payouts: List[Tuple[int, int, Optional[int]]], kind: str, channel_id: int, ledger_kind: int = LEDGER_PAYOUT):
+    rows = _settle_bets(cursor, payouts, ledger_kind) if payouts else {}
+    _delete_game_session(cursor, kind, channel_id)
+    return rows
+
+async def settle_session(payouts: List[Tuple[int, int, int]], kind: str, channel_id: int) -> Dict[int, int]:
+    """
+    Settle every held bet of a game, e.g. a whole roulette round, and delete
+    its session in one transaction
+    Takes (user_id, payout, stake) rows, losers included so their losses are
+    counted, and returns each user's new balance
+    """
+    rows = await _write(_settle_session, payouts, kind, channel_id)
+    for user_id, row in rows.items():
+        _remember(user_id, row)
+    return {user_id: row[0] for user_id, row in rows.items()}
+
+async def refund_session(refunds: List[Tuple[int, int]], kind: str, channel_id: int) -> Dict[int, int]:
+    """Give back every held stake of a game that never got going, as (user_id, amount) rows, and delete its session"""
+    payouts = [(user_id, amount, None) for user_id, amount in refunds]
+    rows = await _write(_settle_session, payouts, kind, channel_id, LEDGER_REFUND)
+    for user_id, row in rows.items():
+        _remember(user_id, row)
+    return {user_id: row[0] for user_id, row in rows.items()}
+
+def _get_game_sessions(cursor: sqlite3.Cursor, kind: str):
+    cursor.execute(
+        "SELECT channel_id, key, state FROM game_sessions WHERE kind = ? AND cluster = ?",
+        (kind, _cluster_id)
+    )
+    return cursor.fetchall()
+
+async def get_game_sessions(kind: str) -> Dict[int, Tuple[dict, Dict[int, object]]]:
+    """Saved games of one kind as channel_id: (state, {key: entry})"""
+    sessions = {}
+    for channel_id, key, state in await _read(_get_game_sessions, kind):
+        header, entries = sessions.setdefault(channel_id, ({}, {}))
+        if key == 0:
+            header.update(json.loads(state))
+        else:
+            entries[key] = json.loads(state)
+    return sessions
+
+def _snapshot_range(cursor: sqlite3.Cursor):
+    cursor.execute("SELECT MAX(ledger_id) FROM snapshot_runs")
+    last = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM ledger")
+    head = cursor.fetchone()[0]
+    if last is None:
+        # The first run takes every balance, including ones from before the ledger existed
+        cursor.execute("SELECT id FROM users WHERE points != 0")
+    else:
+        cursor.execute("SELECT DISTINCT user_id FROM ledger WHERE id > ? AND id <= ?", (last, head))
+    return last, head, [row[0] for row in cursor.fetchall()]
+
+def _snapshot_chunk(cursor: sqlite3.Cursor, user_ids: List[int], head: int, now: int):
+    # Balances as of the run's head, so entries written since the run started aren't counted twice
+    cursor.execute(
+        f"""
+        INSERT OR IGNORE INTO balance_snapshots
+        SELECT id, ?1, ?2, points - COALESCE((SELECT SUM(delta) FROM ledger WHERE user_id = users.id AND id > ?1), 0)
+        FROM users WHERE id IN ({', '.join('?' * len(user_ids))})
+        """,
+        (head, now, *user_ids)
+    )
+
+def _finish_snapshot_run(cursor: sqlite3.Cursor, head: int, now: int):
+    cursor.execute("INSERT OR IGNORE INTO snapshot_runs (ledger_id, time) VALUES (?, ?)", (head, now))
+
+async def snapshot_balances() -> int:
+    """
+    Snapshot every balance that changed since the last run; returns how many
+    Written a chunk of users at a time so a busy hour doesn't hold up the writer
+    """
+    last, head, user_ids = await _read(_snapshot_range)
+    if last is not None and head <= last:
+        return 0
+
+    now = int(time.time())
+    for start in range(0, len(user_ids), _SQL_CHUNK_SIZE):
+        await _write(_snapshot_chunk, user_ids[start:start + _SQL_CHUNK_SIZE], head, now)
+    await _write(_finish_snapshot_run, head, now)
+    return len(user_ids)
+
+def _get_ledger(cursor: sqlite3.Cursor, user_id: int, limit: int, before: Optional[int]):
+    cursor.execute(
+        "SELECT id, kind, delta, time, ref FROM ledger WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+        (user_id, before if before is not None else (1 << 63) - 1, limit)
+    )
+    return cursor.fetchall()
+
+async def get_ledger(user_id: int, limit: int = 25, before: Optional[int] = None) -> List[Tuple[int, int, int, int, Optional[int]]]:
+    """
+    A user's ledger entries as (id, kind, delta, time, ref), newest first
+    Pass the last id of a page as ``before`` for the next one
+    """
+    return await _read(_get_ledger, user_id, limit, before)
+
+def _get_balance_at(cursor: sqlite3.Cursor, user_id: int, timestamp: int):
+    cursor.execute(
+        "SELECT ledger_id, balance FROM balance_snapshots WHERE user_id = ? AND time <= ? "
+        "ORDER BY ledger_id DESC LIMIT 1",
+        (user_id, timestamp)
+    )
+    ledger_id, balance = cursor.fetchone() or (0, 0)
+    # Only the entries since the snapshot are summed, at most one snapshot interval's worth
+    cursor.execute(
+        "SELECT COALESCE(SUM(delta), 0) FROM ledger WHERE user_id = ? AND id > ? AND time <= ?",
+        (user_id, ledger_id, timestamp)
+    )
+    return balance + cursor.fetchone()[0]
+
+async def get_balance_at(user_id: int, timestamp: float) -> Optional[int]:
+    """
+    A user's balance at a past unix time
+    Returns None for times old enough to have been rotated out to an archive
+    """
+    if LEDGER_RETENTION_DAYS and timestamp < time.time() - LEDGER_RETENTION_DAYS * 86400:
+        return None
+    return await _read(_get_balance_at, user_id, int(timestamp))
+
+# Snapshots older than the rotation boundary that a newer one, still at or
+# below the boundary, makes redundant
+_SUPERSEDED_SNAPSHOTS = """
+    FROM {schema}balance_snapshots AS old
+    WHERE old.ledger_id < ?1 AND EXISTS (
+        SELECT 1 FROM {schema}balance_snapshots AS new
+        WHERE new.user_id = old.user_id AND new.ledger_id > old.ledger_id AND new.ledger_id <= ?1
+    )
+"""
+
+def _rotation_range(cursor: sqlite3.Cursor, cutoff: int):
+    # Rows can only leave once a completed snapshot run after them is also past
+    # the cutoff, so every balance inside the retention window stays reconstructable
+    cursor.execute(
+        "SELECT ledger_id, time FROM snapshot_runs WHERE time < ? ORDER BY ledger_id DESC LIMIT 1",
+        (cutoff,)
+    )
+    boundary = cursor.fetchone()
+    cursor.execute("SELECT id, time FROM ledger ORDER BY id LIMIT 1")
+    return cursor.fetchone(), boundary
+
+def _archive_months(first_time: int, last_time: int) -> List[Tuple[str, int, int]]:
+    """
+    (month, start, end) for every UTC month from first_time's to last_time's
+    The first month is open below and the last open above, so a row written a
+    moment out of order still lands in exactly one file
+    """
+    year, month = time.gmtime(first_time)[:2]
+    last = time.gmtime(last_time)[:2]
+    months = []
+    start = -(1 << 63)
+    while (year, month) != last:
+        following = (year + month // 12, month % 12 + 1)
+        end = calendar.timegm((*following, 1, 0, 0, 0))
+        months.append((f"{year:04d}-{month:02d}", start, end))
+        (year, month), start = following, end
+    months.append((f"{year:04d}-{month:02d}", start, (1 << 63) - 1))
+    return months
+
+def _archive_ledger(months: List[Tuple[str, int, int]], first: int, boundary: int) -> List[Tuple[int, int]]:
+    """Copy ledger rows and superseded snapshots up to ``boundary`` into the archive file of the month they were written in"""
+    connections = []
+    try:
+        for month, _, _ in months:
+            connection = sqlite3.connect(LEDGER_ARCHIVE_PATH.format(month=month))
+            connection.isolation_level = None
+            connections.append(connection)
+            cursor = connection.cursor()
+            _setup_ledger_tables(cursor)
+            cursor.execute("ATTACH DATABASE ? AS hot", (DATABASE_PATH,))
+
+        # Chunked so no read of the live database lasts long enough to hold up its WAL checkpoints
+        for start in range(first, boundary + 1, _LEDGER_CHUNK_SIZE * 10):
+            end = min(start + _LEDGER_CHUNK_SIZE * 10, boundary + 1)
+            for connection, (_, month_start, month_end) in zip(connections, months):
+                connection.execute("BEGIN")
+                connection.execute(
+                    "INSERT OR IGNORE INTO main.ledger SELECT * FROM hot.ledger "
+                    "WHERE id >= ? AND id < ? AND time >= ? AND time < ?",
+                    (start, end, month_start, month_end)
+                )
+                connection.execute("COMMIT")
+
+        cursor = connections[0].execute(
+            "SELECT old.user_id, old.ledger_id " + _SUPERSEDED_SNAPSHOTS.format(schema="hot."), (boundary,)
+        )
+        superseded = cursor.fetchall()
+        for connection, (_, month_start, month_end) in zip(connections, months):
+            connection.execute("BEGIN")
+            connection.execute(
+                "INSERT OR IGNORE INTO main.balance_snapshots SELECT old.* "
+                + _SUPERSEDED_SNAPSHOTS.format(schema="hot.") + " AND old.time >= ?2 AND old.time < ?3",
+                (boundary, month_start, month_end)
+            )
+            connection.execute("COMMIT")
+        return superseded
+    finally:
+        for connection in connections:
+            connection.close()
+
+def _delete_ledger_rows(cursor: sqlite3.Cursor, start: int, end: int):
+    cursor.execute("DELETE FROM ledger WHERE id >= ? AND id < ?", (start, end))
+
+def _delete_snapshots(cursor: sqlite3.Cursor, keys: List[Tuple[int, int]]):
+    cursor.executemany("DELETE FROM balance_snapshots WHERE user_id = ? AND ledger_id = ?", keys)
+
+async def rotate_ledger() -> int:
+    """
+    Move ledger rows older than the retention window into the archive file of
+    the month each was written in, copying them before deleting, so a failed
+    rotation just runs again
+    Returns how many ledger rows left the live database
+    """
+    if not LEDGER_RETENTION_DAYS:
+        return 0
+    cutoff = int(time.time() - LEDGER_RETENTION_DAYS * 86400)
+    oldest, boundary = await _read(_rotation_range, cutoff)
+    if oldest is None or boundary is None or oldest[0] > boundary[0]:
+        return 0
+
+    first = oldest[0]
+    months = _archive_months(oldest[1], boundary[1])
+    loop = asyncio.get_running_loop()
+    superseded = await loop.run_in_executor(_readers, _archive_ledger, months, first, boundary[0])
+
+    # Deleted a chunk per write so settlements keep flowing between them
+    for start in range(first, boundary[0] + 1, _LEDGER_CHUNK_SIZE):
+        await _write(_delete_ledger_rows, start, min(start + _LEDGER_CHUNK_SIZE, boundary[0] + 1))
+    for start in range(0, len(superseded), _LEDGER_CHUNK_SIZE):
+        await _write(_delete_snapshots, superseded[start:start + _LEDGER_CHUNK_SIZE])
+
+    paths = ", ".join(LEDGER_ARCHIVE_PATH.format(month=month) for month, _, _ in months)
+    print(f"🟩 | Archived ledger rows {first:,} to {boundary[0]:,} to {paths}")
+    return boundary[0] - first + 1
+
+async def _ledger_loop():
+    rotated = 0.0
+    while True:
+        try:
+            await snapshot_balances()
+            if time.time() - rotated >= 86400:
+                await rotate_ledger()
+                rotated = time.time()
+        except sqlite3.Error as error:
+            print(f"🟥 | Ledger maintenance failed: {error}")
+        await asyncio.sleep(LEDGER_SNAPSHOT_INTERVAL)
+
+def start_ledger_tasks():
+    """Start the periodic snapshot and rotation task, once, in one process of a cluster"""
+    global _ledger_task
+    if _clustered and _cluster_id != 0:
+        return
+    if _ledger_task is None or _ledger_task.done():
+        _ledger_task = asyncio.create_task(_ledger_loop())
+
+async def backup(path: Optional[str] = None) -> str:
+    """Take an online backup without blocking the event loop or the writer; returns its path"""
+    path = path or backup_path(DATABASE_PATH, BACKUP_DIR, time.time())
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    pages = await loop.run_in_executor(
+        _backups, backup_database, DATABASE_PATH, path, BACKUP_STEP_PAGES, BACKUP_STEP_SLEEP
+    )
+    print(f"🟩 | Backed up {pages:,} pages to {path} in {time.perf_counter() - started:.1f}s")
+    return path
+
+async def _backup_loop():
+    while True:
+        await asyncio.sleep(BACKUP_INTERVAL)
+        try:
+            await backup()
+            prune_backups(DATABASE_PATH, BACKUP_DIR, BACKUP_KEEP)
+        except (sqlite3.Error, OSError) as error:
+            print(f"🟥 | Backup failed: {error}")
+
+def start_backups():
+    """Start the periodic backup task, once, in one process of a cluster"""
+    global _backup_task
+    if not BACKUP_INTERVAL or (_clustered and _cluster_id != 0):
+        return
+    if _backup_task is None or _backup_task.done():
+        _backup_task = asyncio.create_task(_backup_loop())
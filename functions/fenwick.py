@@ -0,0 +1,117 @@
+import random
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+
+class FenwickTree:
+    """
+    Prefix sums over a growable list of non-negative weights.
+
+    Appending, changing a weight, summing a prefix and finding the slot a
+    running total falls in are all O(log n).
+    """
+
+    __slots__ = ("tree", "total")
+
+    def __init__(self, weights: Sequence[int] = ()):
+        # 1-based, tree[0] is unused. Building from a list pushes each node
+        # into its parent once, which is O(n) rather than n appends.
+        self.tree: List[int] = [0, *weights]
+        size = len(self.tree)
+        for index in range(1, size):
+            parent = index + (index & -index)
+            if parent < size:
+                self.tree[parent] += self.tree[index]
+        self.total = sum(weights)
+
+    def __len__(self) -> int:
+        return len(self.tree) - 1
+
+    def append(self, weight: int) -> int:
+        """Add a slot holding ``weight`` and return its 0-based index"""
+        index = len(self.tree)
+        # tree[index] covers (index - lowbit, index], i.e. this weight plus the
+        # slots already summed under the nodes that end just before it
+        lowbit = index & -index
+        self.tree.append(weight + self.prefix(index - 1) - self.prefix(index - lowbit))
+        self.total += weight
+        return index - 1
+
+    def add(self, index: int, delta: int):
+        self.total += delta
+        index += 1
+        size = len(self.tree)
+        while index < size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, count: int) -> int:
+        """Sum of the first ``count`` weights"""
+        total = 0
+        while count > 0:
+            total += self.tree[count]
+            count -= count & -count
+        return total
+
+    def find(self, value: int) -> int:
+        """Index of the slot the running total passes ``value`` in, for 0 <= value < total"""
+        index = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            node = index + step
+            if node < len(self.tree) and self.tree[node] <= value:
+                index = node
+                value -= self.tree[node]
+            step >>= 1
+        return index
+
+
+class ContributionPool:
+    """
+    A jackpot's contributions by user, backed by a Fenwick tree so adding to
+    a pot and drawing a winner weighted by contribution stay O(log n) however
+    many people have joined.
+    """
+
+    __slots__ = ("weights", "slots", "users", "amounts")
+
+    def __init__(self, contributions: Dict[int, int] = None):
+        self.amounts: Dict[int, int] = dict(contributions or {})  # user_id: contribution
+        self.users: List[int] = list(self.amounts)  # slot: user_id
+        self.slots: Dict[int, int] = {user_id: slot for slot, user_id in enumerate(self.users)}
+        self.weights = FenwickTree(list(self.amounts.values()))
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.slots
+
+    def __getitem__(self, user_id: int) -> int:
+        return self.amounts[user_id]
+
+    def items(self) -> Iterator[Tuple[int, int]]:
+        return iter(self.amounts.items())
+
+    @property
+    def total(self) -> int:
+        return self.weights.total
+
+    def add(self, user_id: int, amount: int) -> int:
+        """Add to a user's contribution, returning their new total"""
+        slot = self.slots.get(user_id)
+        if slot is None:
+            self.slots[user_id] = self.weights.append(amount)
+            self.users.append(user_id)
+            self.amounts[user_id] = amount
+        else:
+            self.weights.add(slot, amount)
+            self.amounts[user_id] += amount
+        return self.amounts[user_id]
+
+    def odds(self, user_id: int) -> float:
+        """A user's chance of winning, from 0 to 1"""
+        return self.amounts.get(user_id, 0) / self.weights.total
+
+    def draw(self, rng=random) -> int:
+        """Pick a winner, weighted by contribution, with anything that has ``randrange``"""
+        return self.users[self.weights.find(rng.randrange(self.weights.total))]
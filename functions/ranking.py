@@ -0,0 +1,111 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Sequence, Tuple
+
+from functions.fenwick import FenwickTree
+
+# Users are ordered by one int key: most points first, then lowest id. User
+# ids are Discord snowflakes, which fit in 64 bits.
+_ID_BITS = 64
+_ID_MASK = (1 << _ID_BITS) - 1
+
+
+def _key(user_id: int, points: int) -> int:
+    return (-points << _ID_BITS) | user_id
+
+
+class RankIndex:
+    """
+    Every user's points kept in order, for leaderboard pages and ranks.
+
+    Keys live in sorted buckets of about ``bucket_size`` (a sorted list
+    split into chunks), with a Fenwick tree over the bucket sizes. Finding a
+    rank or the start of a page is a bisect over the buckets plus a prefix
+    sum, both O(log n), and a balance change moves one key between buckets.
+    """
+
+    def __init__(self, rows: Sequence[Tuple[int, int]] = (), bucket_size: int = 1000):
+        """``rows`` are (user_id, points) pairs in any order"""
+        self.bucket_size = bucket_size
+        self.points: Dict[int, int] = dict(rows)
+        keys = sorted(_key(user_id, points) for user_id, points in self.points.items())
+        self.buckets: List[List[int]] = [keys[start:start + bucket_size] for start in range(0, len(keys), bucket_size)]
+        self._reindex()
+
+    def _reindex(self):
+        self.maxes = [bucket[-1] for bucket in self.buckets]
+        self.sizes = FenwickTree([len(bucket) for bucket in self.buckets])
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.points
+
+    def _insert(self, key: int):
+        if not self.buckets:
+            self.buckets.append([key])
+            self._reindex()
+            return
+
+        index = bisect_left(self.maxes, key)
+        if index == len(self.buckets):
+            index -= 1
+            self.buckets[index].append(key)
+            self.maxes[index] = key
+        else:
+            insort(self.buckets[index], key)
+        self.sizes.add(index, 1)
+
+        bucket = self.buckets[index]
+        if len(bucket) > 2 * self.bucket_size:
+            # Splitting shifts every later bucket, so the tree is rebuilt;
+            # that is O(n / bucket_size) once every bucket_size inserts
+            self.buckets[index:index + 1] = [bucket[:self.bucket_size], bucket[self.bucket_size:]]
+            self._reindex()
+
+    def _remove(self, key: int):
+        index = bisect_left(self.maxes, key)
+        bucket = self.buckets[index]
+        del bucket[bisect_left(bucket, key)]
+        if bucket:
+            self.maxes[index] = bucket[-1]
+            self.sizes.add(index, -1)
+        else:
+            del self.buckets[index]
+            self._reindex()
+
+    def update(self, user_id: int, points: int):
+        """Record a user's new balance"""
+        old = self.points.get(user_id)
+        if old == points:
+            return
+        if old is not None:
+            self._remove(_key(user_id, old))
+        self._insert(_key(user_id, points))
+        self.points[user_id] = points
+
+    def _position(self, key: int) -> int:
+        """How many keys sort before ``key``"""
+        index = bisect_left(self.maxes, key)
+        if index == len(self.buckets):
+            return len(self.points)
+        return self.sizes.prefix(index) + bisect_left(self.buckets[index], key)
+
+    def rank(self, points: int) -> int:
+        """Rank of a balance, counting from 1; users on the same points share a rank"""
+        return self._position(_key(0, points)) + 1
+
+    def top(self, count: int, offset: int = 0) -> List[Tuple[int, int]]:
+        """(user_id, points) for ``count`` users from position ``offset``, most points first"""
+        if offset >= len(self.points):
+            return []
+
+        index = self.sizes.find(offset)
+        start = offset - self.sizes.prefix(index)
+        page = []
+        while len(page) < count and index < len(self.buckets):
+            for key in self.buckets[index][start:start + count - len(page)]:
+                page.append((key & _ID_MASK, -(key >> _ID_BITS)))
+            index += 1
+            start = 0
+        return page
@@ -0,0 +1,114 @@
+import time
+from datetime import datetime
+from typing import Any, Callable, Sequence
+
+import discord
+
+from functions.cards import RANKS, SUITS
+
+# Emoji for each suit and face card, looked up once per card instead of
+# rebuilding the maps on every render
+SUIT_GLYPHS = {
+    "♠": "♠️",
+    "♥": "♥️",
+    "♦": "♦️",
+    "♣": "♣️"
+}
+RANK_GLYPHS = {
+    "A": "🅰️",
+    "K": "👑",
+    "Q": "👸",
+    "J": "🎭"
+}
+# Indexed by card, see functions.cards
+CARD_GLYPHS = [
+    f"{RANK_GLYPHS.get(rank, rank)}{SUIT_GLYPHS[suit]}"
+    for suit in SUITS
+    for rank in RANKS
+]
+HIDDEN_CARD = "🃏"
+
+# Discord rejects embed descriptions longer than this
+DESCRIPTION_LIMIT = 4096
+
+_footer_minute = None
+_footer_text = ""
+
+
+def footer_text() -> str:
+    """The "Today at" footer, formatted once per minute rather than once per embed"""
+    global _footer_minute, _footer_text
+    minute = int(time.time() // 60)
+    if minute != _footer_minute:
+        _footer_text = f"Today at {datetime.now().strftime('%I:%M %p')}"
+        _footer_minute = minute
+    return _footer_text
+
+
+def create_embed(title: str, description: str, color: discord.Color = discord.Color.teal()) -> discord.Embed:
+    """Build an embed with the shared footer"""
+    embed = discord.Embed(title=title, description=description, color=color)
+    embed.set_footer(text=footer_text())
+    return embed
+
+
+class EmbedTemplate:
+    """
+    An embed whose title and colour never change, only its description.
+
+    ``discord.Embed.copy`` round-trips through ``to_dict``, which costs more
+    than building a fresh embed, so ``render`` constructs one from the stored
+    parts instead of copying a prototype.
+    """
+
+    __slots__ = ("title", "color")
+
+    def __init__(self, title: str, color: discord.Color):
+        self.title = title
+        self.color = color
+
+    def render(self, description: str) -> discord.Embed:
+        return create_embed(self.title, description, self.color)
+
+
+def format_card(card: int) -> str:
+    """Format a single card for display"""
+    return CARD_GLYPHS[card]
+
+
+def format_hand(hand: Sequence[int]) -> str:
+    """Format a hand of cards for display"""
+    return " ".join([CARD_GLYPHS[card] for card in hand])
+
+
+def blackjack_hands(player_hand: Sequence[int], player_value: int, dealer_hand: Sequence[int], dealer_value: int, hide_hole_card: bool = False) -> str:
+    """The two hands as shown at the top of every blackjack embed"""
+    if hide_hole_card:
+        dealer_cards = f"{CARD_GLYPHS[dealer_hand[0]]} {HIDDEN_CARD}"
+    else:
+        dealer_cards = format_hand(dealer_hand)
+    return (
+        f"**Your Hand** ({player_value}):\n{format_hand(player_hand)}\n\n"
+        f"**Dealer's Hand** ({dealer_value}):\n{dealer_cards}"
+    )
+
+
+def join_lines(items: Sequence, limit: int, line: Callable[[Any], str] = str) -> str:
+    """
+    Render ``items`` one per line up to ``limit`` characters and summarise the
+    rest, so a round with thousands of players still fits in one embed. Items
+    past the limit are never formatted.
+    """
+    lines = []
+    length = 0
+    for index, item in enumerate(items):
+        text = line(item)
+        length += len(text) + 1
+        # Past the limit, back off far enough to fit the summary line
+        if length - 1 > limit:
+            while lines and length > limit - 24:
+                length -= len(lines.pop()) + 1
+            lines.append(f"...and {len(items) - len(lines):,} more")
+            break
+        lines.append(text)
+    return "\n".join(lines)
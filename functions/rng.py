@@ -0,0 +1,137 @@
+import hashlib
+import secrets
+import sys
+from array import array
+from typing import Dict, MutableSequence, Optional, Sequence
+
+# Output of the round's hash is fetched at least this many bytes at a time;
+# most rounds need only a few
+ROUND_BLOCK_SIZE = 64
+# Fresh round seeds are fetched from the OS this many at a time
+SEED_BATCH_SIZE = 64
+SEED_BYTES = 16
+
+
+class RoundRandom:
+    """
+    The randomness for one game round.
+
+    Every draw is read from SHAKE-256 output of the round's seed, fetched in
+    blocks, so anyone holding the seed can replay the round draw for draw.
+    Draws are unbiased: values past the last whole multiple of the range are
+    rejected and the next bytes are read instead. Shuffles sort by 64-bit
+    keys read in one go, so a whole shoe is shuffled without a Python-level
+    draw per card.
+    """
+
+    __slots__ = ("seed", "buffer", "position")
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.buffer = b""
+        self.position = 0
+
+    def _fetch(self, end: int):
+        # SHAKE output is a stream, so a longer digest starts with the bytes already used
+        size = max(end, 2 * len(self.buffer), ROUND_BLOCK_SIZE)
+        self.buffer = hashlib.shake_256(self.seed.to_bytes(SEED_BYTES, "big")).digest(size)
+
+    def _take(self, count: int) -> bytes:
+        end = self.position + count
+        if end > len(self.buffer):
+            self._fetch(end)
+        chunk = self.buffer[self.position:end]
+        self.position = end
+        return chunk
+
+    def randbelow(self, n: int) -> int:
+        """A uniform int from 0 to n - 1"""
+        if n <= 256:
+            # One byte per try, read straight from the buffer
+            limit = 256 - 256 % n
+            while True:
+                if self.position == len(self.buffer):
+                    self._fetch(self.position + 1)
+                value = self.buffer[self.position]
+                self.position += 1
+                if value < limit:
+                    return value % n
+
+        size = (n.bit_length() + 7) // 8
+        limit = (1 << (8 * size)) // n * n
+        while True:
+            value = int.from_bytes(self._take(size), "big")
+            if value < limit:
+                return value % n
+
+    def randint(self, a: int, b: int) -> int:
+        return a + self.randbelow(b - a + 1)
+
+    def choice(self, seq: Sequence):
+        return seq[self.randbelow(len(seq))]
+
+    def randrange(self, stop: int) -> int:
+        return self.randbelow(stop)
+
+    def shuffle(self, items: MutableSequence):
+        """Shuffle in place by sorting on random keys; a tie between 64-bit keys is vanishingly rare"""
+        keys = array("Q", self._take(8 * len(items)))
+        if sys.byteorder == "big":
+            keys.byteswap()  # keys read the same on every machine, so replays match
+        order = sorted(range(len(items)), key=keys.__getitem__)
+        items[:] = [items[index] for index in order]
+
+
+class RandomStream:
+    """
+    Hands out round seeds for one game.
+
+    Without a master seed each round seed comes from the OS, fetched in
+    batches. With one, seeds are derived from the master seed, the game name
+    and a round counter, so a whole run can be reproduced.
+    """
+
+    __slots__ = ("name", "master_seed", "rounds", "batch", "position")
+
+    def __init__(self, name: str, master_seed: Optional[int] = None):
+        self.name = name
+        self.master_seed = master_seed
+        self.rounds = 0
+        self.batch = b""
+        self.position = 0
+
+    def next_seed(self) -> int:
+        self.rounds += 1
+        if self.master_seed is not None:
+            digest = hashlib.shake_256(f"{self.master_seed}:{self.name}:{self.rounds}".encode()).digest(SEED_BYTES)
+            return int.from_bytes(digest, "big")
+
+        if self.position == len(self.batch):
+            self.batch = secrets.token_bytes(SEED_BYTES * SEED_BATCH_SIZE)
+            self.position = 0
+        seed = int.from_bytes(self.batch[self.position:self.position + SEED_BYTES], "big")
+        self.position += SEED_BYTES
+        return seed
+
+
+class RandomService:
+    """One stream per game; each round gets its own seed, which is logged so the round can be replayed"""
+
+    def __init__(self, master_seed: Optional[int] = None, log: bool = True):
+        self.master_seed = master_seed
+        self.log = log
+        self.streams: Dict[str, RandomStream] = {}
+
+    def round(self, game: str, context: object = "") -> RoundRandom:
+        stream = self.streams.get(game)
+        if stream is None:
+            stream = self.streams[game] = RandomStream(game, self.master_seed)
+        seed = stream.next_seed()
+        if self.log:
+            print(f"🟦 | {game} round {context} seed {seed:032x}")
+        return RoundRandom(seed)
+
+    @staticmethod
+    def replay(seed: int) -> RoundRandom:
+        """The same draws a logged round made"""
+        return RoundRandom(seed)
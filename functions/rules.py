@@ -0,0 +1,68 @@
+from typing import List, Tuple
+
+from functions.cards import Shoe, add_card, hand_value
+from functions.rng import RoundRandom
+
+# Payouts are what a settled bet hands back, with the stake already held by
+# reserve_bet: 0 loses the stake, the stake itself is a push.
+COINFLIP_SIDES = ["heads", "tails"]
+ROULETTE_COLORS = ["red", "black"]
+DICE_FACES = 6
+DICE_TARGETS = [3, 4, 5]
+DEALER_STANDS_ON = 17
+
+
+def flip_coin(rng: RoundRandom) -> str:
+    return rng.choice(COINFLIP_SIDES)
+
+
+def coinflip_payout(amount: int, won: bool) -> int:
+    return amount * 2 if won else 0
+
+
+def dice_win_chance(target: int) -> float:
+    return (DICE_FACES - target) / DICE_FACES
+
+
+def dice_multiplier(target: int) -> float:
+    return DICE_FACES / (DICE_FACES - target)
+
+
+def dice_winnings(amount: int, target: int) -> int:
+    return int(amount * dice_multiplier(target))
+
+
+def roll_dice(rng: RoundRandom) -> int:
+    return rng.randint(1, DICE_FACES)
+
+
+def dice_payout(amount: int, target: int, roll: int) -> int:
+    return amount + dice_winnings(amount, target) if roll > target else 0
+
+
+def spin_roulette(rng: RoundRandom) -> Tuple[str, int]:
+    """The winning colour and the number shown with it"""
+    return rng.choice(ROULETTE_COLORS), rng.randint(0, 36)
+
+
+def roulette_payout(amount: int, won: bool) -> int:
+    return amount * 2 if won else 0
+
+
+def play_dealer(shoe: Shoe, hand: List[int], score: int) -> int:
+    """Draw into the dealer's hand until they stand, returning their final score"""
+    while hand_value(score) < DEALER_STANDS_ON:
+        card = shoe.draw()
+        hand.append(card)
+        score = add_card(score, card)
+    return score
+
+
+def blackjack_payout(amount: int, player_value: int, dealer_value: int) -> int:
+    if player_value > 21:
+        return 0
+    if dealer_value > 21 or player_value > dealer_value:
+        return amount * 2
+    if player_value < dealer_value:
+        return 0
+    return amount
@@ -0,0 +1,95 @@
+import asyncio
+import heapq
+import json
+import time
+from typing import Awaitable, Callable, Dict
+
+from functions.database import (
+    add_scheduled_event,
+    delete_scheduled_event,
+    get_scheduled_events
+)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+# A handler that raises is tried again, waiting twice as long each time up to the cap
+RETRY_DELAY = 5.0
+MAX_RETRY_DELAY = 300.0
+
+
+class Scheduler:
+    """
+    Persistent timers backed by the ``scheduled_events`` table.
+
+    Pending events sit in one heap ordered by due time and a single task sleeps
+    until the earliest one, so a pot that runs for days costs no coroutine of
+    its own. ``start`` reloads whatever was still pending, so deadlines survive
+    a restart; events that came due while the bot was down fire right away.
+    An event is only deleted once its handler succeeds; until then it is
+    retried with a backoff, and a restart fires it again.
+    """
+
+    def __init__(self, handlers: Dict[str, Handler]):
+        self.handlers = handlers
+        self.heap = []  # (due, event_id, kind, payload)
+        self.running = set()
+        self.failures: Dict[int, int] = {}  # event_id: failed attempts so far
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    async def start(self):
+        for event_id, due, kind, payload in await get_scheduled_events(list(self.handlers)):
+            self.heap.append((due, event_id, kind, payload))
+        heapq.heapify(self.heap)
+        self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+
+    async def schedule(self, kind: str, due: float, payload: dict) -> int:
+        """Persist an event that fires ``handlers[kind](payload)`` at the ``due`` unix timestamp"""
+        encoded = json.dumps(payload)
+        event_id = await add_scheduled_event(kind, due, encoded)
+        self._push(due, event_id, kind, encoded)
+        return event_id
+
+    def _push(self, due: float, event_id: int, kind: str, payload: str):
+        heapq.heappush(self.heap, (due, event_id, kind, payload))
+        if self.heap[0][1] == event_id:
+            self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            self.wakeup.clear()
+            if not self.heap:
+                await self.wakeup.wait()
+                continue
+
+            delay = self.heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, event_id, kind, payload = heapq.heappop(self.heap)
+            task = asyncio.create_task(self._fire(event_id, kind, payload))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _fire(self, event_id: int, kind: str, payload: str):
+        try:
+            await self.handlers[kind](json.loads(payload))
+        except Exception as error:
+            # The row stays, so the event is retried here and again after a restart
+            attempts = self.failures.get(event_id, 0) + 1
+            self.failures[event_id] = attempts
+            delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+            print(f"🟥 | Scheduled {kind} event {event_id} failed, retrying in {delay:.0f}s: {error}")
+            self._push(time.time() + delay, event_id, kind, payload)
+            return
+
+        self.failures.pop(event_id, None)
+        await delete_scheduled_event(event_id)
@@ -1,26 +1,171 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
 import discord
 from discord.ext import commands
 
+import config
 from config import BOT_TOKEN
 from functions.database import *
 
-bot = commands.Bot(command_prefix=".", intents=discord.Intents.all())
+# Sharding: SHARD_COUNT runs that many shards (None lets Discord pick) and
+# CLUSTER_COUNT splits them over that many processes. Both can be
+# overridden on the command line, see --help.
+SHARD_COUNT = getattr(config, "SHARD_COUNT", None)
+CLUSTER_COUNT = getattr(config, "CLUSTER_COUNT", 1)
+# "lean" only subscribes to what the cogs use (slash commands and the payment
+# channel's messages) and keeps no member or message cache; "full" is every
+# intent with discord.py's default caching.
+CACHE_PROFILE = getattr(config, "CACHE_PROFILE", "lean")
+MESSAGE_CACHE_SIZE = getattr(config, "MESSAGE_CACHE_SIZE", None)
+# Hash of the last command tree pushed to Discord, so restarts skip the sync
+COMMAND_SIGNATURE_PATH = getattr(config, "COMMAND_SIGNATURE_PATH", "databases/command_signature")
+
+
+def client_options(profile: str) -> dict:
+    """Intents and cache settings for a deployment profile"""
+    if profile == "full":
+        return {"intents": discord.Intents.all()}
 
-@bot.event
-async def on_ready():
-    print(f"🟩 | Bot loaded as {bot.user.name}")
+    intents = discord.Intents.none()
+    intents.guilds = True  # channel cache, so Deposit can find the payment channel
+    intents.guild_messages = True  # Deposit reads payment confirmations
+    intents.message_content = True
+    return {
+        "intents": intents,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+        "chunk_guilds_at_startup": False,
+        "max_messages": MESSAGE_CACHE_SIZE
+    }
 
-    setup_tables()
-    print(f"🟩 | Setup all tables")
 
-    await bot.load_extension("extensions.Admin")
-    await bot.load_extension("extensions.Games")
-    await bot.load_extension("extensions.Deposit")
-    print(f"🟩 | Loaded all extensions")
+async def sync_commands(bot: commands.Bot):
+    """Sync the app command tree, but only if it changed since the last sync"""
+    commands_payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    signature = hashlib.sha256(
+        json.dumps([bot.application_id, commands_payload], sort_keys=True).encode()
+    ).hexdigest()
+
+    if os.path.exists(COMMAND_SIGNATURE_PATH):
+        with open(COMMAND_SIGNATURE_PATH) as file:
+            if file.read().strip() == signature:
+                print("🟩 | Commands unchanged, skipped sync")
+                return
 
     await bot.tree.sync()
+    with open(COMMAND_SIGNATURE_PATH, "w") as file:
+        file.write(signature)
     print("🟩 | Synced all commands")
 
+def create_bot(shard_ids: list = None, shard_count: int = None, sharded: bool = False, sync: bool = True) -> commands.Bot:
+    started = time.perf_counter()
+    reported = set()
+
+    def report_startup(stage: str):
+        """Log how long after launch a startup stage was first reached, i.e. the time to first command"""
+        if stage not in reported:
+            reported.add(stage)
+            print(f"🟩 | {stage} {time.perf_counter() - started:.2f}s after launch")
+
+    options = client_options(CACHE_PROFILE)
+    if sharded:
+        bot = commands.AutoShardedBot(
+            command_prefix=".",
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            **options
+        )
+    else:
+        bot = commands.Bot(command_prefix=".", **options)
+
+    # Runs once per process before connecting, unlike on_ready which fires on every reconnect
+    async def setup_hook():
+        await setup_tables()
+        await load_leaderboard()
+        start_checkpoints()
+        start_ledger_tasks()
+        start_backups()
+        print(f"🟩 | Setup all tables")
+
+        await bot.load_extension("extensions.Admin")
+        await bot.load_extension("extensions.Games")
+        await bot.load_extension("extensions.Deposit")
+        print(f"🟩 | Loaded all extensions")
+
+        if sync:
+            await sync_commands(bot)
+        report_startup("Setup finished")
+
+    bot.setup_hook = setup_hook
+
+    # Let the writer thread commit whatever is still queued before the process exits
+    close = bot.close
+
+    async def close_and_flush():
+        await close()
+        await asyncio.get_running_loop().run_in_executor(None, close_connections)
+
+    bot.close = close_and_flush
+
+    @bot.event
+    async def on_ready():
+        print(f"🟩 | Bot loaded as {bot.user.name}")
+        report_startup("Ready")
+
+    @bot.listen()
+    async def on_interaction(interaction: discord.Interaction):
+        if interaction.type is discord.InteractionType.application_command:
+            report_startup("First command received")
+
+    return bot
+
+def run_cluster(cluster_id: int, cluster_count: int, shard_count: int):
+    """Run the shards that belong to one process of a multi-process deployment"""
+    shard_ids = [shard_id for shard_id in range(shard_count) if shard_id % cluster_count == cluster_id]
+    set_cluster(cluster_id)
+    print(f"🟩 | Cluster {cluster_id} running shards {shard_ids}")
+    # The command tree is global, so only the first cluster syncs it
+    create_bot(shard_ids, shard_count, sharded=True, sync=cluster_id == 0).run(BOT_TOKEN)
+
+def launch_clusters(cluster_count: int, shard_count: int):
+    """Start one process per cluster and wait for all of them"""
+    processes = [
+        subprocess.Popen([
+            sys.executable, __file__,
+            "--cluster", str(cluster_id),
+            "--clusters", str(cluster_count),
+            "--shards", str(shard_count)
+        ])
+        for cluster_id in range(cluster_count)
+    ]
+    for process in processes:
+        process.wait()
+
 
 if __name__ == "__main__":
-    bot.run(BOT_TOKEN)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the bot")
+    parser.add_argument("--shards", type=int, default=SHARD_COUNT, help="total number of shards")
+    parser.add_argument("--clusters", type=int, default=CLUSTER_COUNT, help="number of processes to split the shards over")
+    parser.add_argument("--cluster", type=int, help="run only this cluster (used by the launcher)")
+    args = parser.parse_args()
+
+    if args.cluster is not None:
+        if not args.shards:
+            parser.error("--cluster needs an explicit --shards count")
+        if not 0 <= args.cluster < args.clusters:
+            parser.error(f"--cluster must be between 0 and {args.clusters - 1}")
+        run_cluster(args.cluster, args.clusters, args.shards)
+    elif args.clusters > 1:
+        if not args.shards:
+            parser.error("--clusters needs an explicit --shards count")
+        launch_clusters(args.clusters, args.shards)
+    elif args.shards:
+        create_bot(shard_count=args.shards, sharded=True).run(BOT_TOKEN)
+    else:
+        create_bot().run(BOT_TOKEN)
@@ -0,0 +1,169 @@
+"""
+Resident memory of discord.py's cache under each CACHE_PROFILE.
+
+A synthetic guild is fed straight into a ConnectionState built with the same
+options the bot uses (main.client_options), so no token or network is needed.
+Under "full" the guild arrives with every member and their presences, as it
+does once chunking finishes; under "lean" Discord sends neither, since the
+members and presences intents are off. A stream of channel messages follows,
+which only a profile with a message cache keeps. Each profile is measured in
+its own process, so one doesn't inherit the other's heap.
+
+    python memory_profile.py --members 100000
+"""
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+GUILD_ID = 1 << 40
+CHANNEL_ID = GUILD_ID + 1
+BOT_ID = GUILD_ID + 2
+# Members are numbered from here, far from the ids above
+FIRST_MEMBER_ID = GUILD_ID + 1000
+
+
+def rss() -> int:
+    """Current resident set size in bytes"""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # No procfs (macOS): fall back to the peak, in bytes there
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def user_payload(user_id: int) -> dict:
+    return {
+        "id": str(user_id),
+        "username": f"member{user_id - FIRST_MEMBER_ID}",
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": None
+    }
+
+
+def member_payload(user_id: int) -> dict:
+    return {
+        "user": user_payload(user_id),
+        "roles": [],
+        "joined_at": "2024-01-01T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0
+    }
+
+
+def guild_payload(members: int, online: float, with_members: bool) -> dict:
+    member_ids = range(FIRST_MEMBER_ID, FIRST_MEMBER_ID + members)
+    online_count = int(members * online)
+    return {
+        "id": str(GUILD_ID),
+        "name": "Synthetic guild",
+        "owner_id": str(BOT_ID),
+        "member_count": members,
+        "large": True,
+        "features": [],
+        "emojis": [],
+        "stickers": [],
+        "roles": [{
+            "id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0,
+            "color": 0, "hoist": False, "managed": False, "mentionable": False, "flags": 0
+        }],
+        "channels": [{"id": str(CHANNEL_ID), "type": 0, "name": "general", "position": 0, "permission_overwrites": []}],
+        "threads": [],
+        "voice_states": [],
+        # The bot's own member always arrives, whatever the intents
+        "members": [member_payload(BOT_ID)] + ([member_payload(user_id) for user_id in member_ids] if with_members else []),
+        "presences": [
+            {"user": {"id": str(user_id)}, "status": "online", "activities": [], "client_status": {"desktop": "online"}}
+            for user_id in member_ids[:online_count]
+        ] if with_members else []
+    }
+
+
+def message_payload(message_id: int, author_id: int) -> dict:
+    return {
+        "id": str(message_id),
+        "channel_id": str(CHANNEL_ID),
+        "guild_id": str(GUILD_ID),
+        "author": user_payload(author_id),
+        "member": {"roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0},
+        "content": "Payment received from member for 500 points",
+        "timestamp": "2024-01-01T00:00:00+00:00",
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0
+    }
+
+
+def measure(profile: str, members: int, online: float, messages: int) -> dict:
+    """Fill one profile's cache and report the memory it took"""
+    from discord.state import ConnectionState
+    from discord.user import ClientUser
+    from main import client_options
+
+    options = client_options(profile)
+    intents = options["intents"]
+    gc.collect()
+    baseline = rss()
+
+    state = ConnectionState(dispatch=lambda *args: None, handlers={}, hooks={}, http=None, **options)
+    state.user = ClientUser(state=state, data=user_payload(BOT_ID))
+    started = time.perf_counter()
+    state._add_guild_from_data(guild_payload(members, online, with_members=intents.members))
+    for index in range(messages):
+        state.parse_message_create(message_payload(CHANNEL_ID + 1 + index, FIRST_MEMBER_ID + index % members))
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    guild = state._get_guild(GUILD_ID)
+    return {
+        "profile": profile,
+        "members_cached": len(guild._members),
+        "messages_cached": len(state._messages or ()),
+        "rss_mib": (rss() - baseline) / 2 ** 20,
+        "load_seconds": elapsed
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cache memory of each deployment profile")
+    parser.add_argument("--members", type=int, default=100_000, help="members in the synthetic guild")
+    parser.add_argument("--online", type=float, default=0.1, help="share of members sent with a presence")
+    parser.add_argument("--messages", type=int, default=5_000, help="channel messages received after the guild")
+    parser.add_argument("--profile", choices=["full", "lean"], help="measure only this profile, in this process")
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(measure(args.profile, args.members, args.online, args.messages)))
+        sys.exit()
+
+    results = []
+    for profile in ("full", "lean"):
+        output = subprocess.run([
+            sys.executable, __file__,
+            "--profile", profile,
+            "--members", str(args.members),
+            "--online", str(args.online),
+            "--messages", str(args.messages)
+        ], check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+
+    print(f"🟩 | {args.members:,} members, {args.messages:,} messages")
+    for result in results:
+        print(
+            f"🟩 | {result['profile']:<4}  {result['rss_mib']:8.1f} MiB  "
+            f"{result['members_cached']:>8,} members  {result['messages_cached']:>6,} messages  "
+            f"loaded in {result['load_seconds']:.2f}s"
+        )
@@ -0,0 +1,188 @@
+"""
+Monte Carlo check of every game's payouts, run offline before changing odds.
+
+Each game is played with the same rule functions the Games cog settles bets
+with (functions.rules), so the numbers describe what the bot actually pays.
+Rounds are split into chunks and spread over a process pool. Games decided by
+a single uniform draw (coinflip, dice, roulette) draw their rounds in bulk as
+random bytes and tally them in C; blackjack plays every hand out.
+
+    python simulate.py --rounds 10000000
+"""
+import argparse
+import os
+import random
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from typing import Dict, List, Tuple
+
+from functions.cards import Shoe, add_card, hand_value
+from functions.rules import (
+    COINFLIP_SIDES,
+    DICE_FACES,
+    ROULETTE_COLORS,
+    blackjack_payout,
+    coinflip_payout,
+    dice_payout,
+    play_dealer,
+    roulette_payout
+)
+
+GAMES = ["coinflip", "dice3", "dice4", "dice5", "roulette", "blackjack"]
+# Rounds per task, which bounds each worker's outcome buffer (one byte a round)
+CHUNK_SIZE = 1_000_000
+
+
+def outcome_nets(game: str, amount: int) -> List[int]:
+    """Net result of a round for each outcome code the game produces"""
+    if game == "coinflip":
+        # The player always calls heads; the coin doesn't care
+        return [coinflip_payout(amount, side == "heads") - amount for side in COINFLIP_SIDES]
+    if game.startswith("dice"):
+        target = int(game[4:])
+        return [dice_payout(amount, target, roll) - amount for roll in range(1, DICE_FACES + 1)]
+    if game == "roulette":
+        return [roulette_payout(amount, color == "red") - amount for color in ROULETTE_COLORS]
+    # Blackjack codes are the payout in stakes: loss, push, win
+    return [-amount, 0, amount]
+
+
+def uniform_outcomes(rounds: int, faces: int) -> bytes:
+    """``rounds`` uniform draws from ``range(faces)``, one byte each"""
+    # Bytes past the last whole multiple of faces are rejected to keep draws unbiased
+    table = bytes(value % faces for value in range(256))
+    rejected = bytes(range(256 - 256 % faces, 256))
+    chunks = []
+    drawn = 0
+    while drawn < rounds:
+        chunk = random.randbytes(rounds - drawn).translate(table, rejected)
+        chunks.append(chunk)
+        drawn += len(chunk)
+    return b"".join(chunks)[:rounds]
+
+
+def blackjack_outcomes(rounds: int, amount: int, decks: int, penetration: float, stand_on: int) -> bytes:
+    """Play ``rounds`` hands, hitting below ``stand_on``, and record each payout in stakes"""
+    shoe = Shoe(decks, penetration)
+    outcomes = bytearray(rounds)
+    dealer_hand = []
+    for index in range(rounds):
+        if shoe.past_cut_card:
+            shoe.reshuffle()
+        player_score = add_card(add_card(0, shoe.draw()), shoe.draw())
+        dealer_score = add_card(add_card(0, shoe.draw()), shoe.draw())
+        while hand_value(player_score) < stand_on:
+            player_score = add_card(player_score, shoe.draw())
+
+        player_value = hand_value(player_score)
+        # The dealer only plays against a player who didn't bust
+        if player_value <= 21:
+            dealer_score = play_dealer(shoe, dealer_hand, dealer_score)
+            dealer_hand.clear()
+        outcomes[index] = blackjack_payout(amount, player_value, hand_value(dealer_score)) // amount
+    return bytes(outcomes)
+
+
+def simulate_chunk(game: str, rounds: int, seed: int, options: Dict) -> Tuple[List[int], int, int]:
+    """
+    Play one chunk of rounds in a worker process.
+    Returns how often each outcome came up, how many sessions were played and
+    how many of them went broke.
+    """
+    random.seed(seed)
+    amount = options["amount"]
+    nets = outcome_nets(game, amount)
+    if game == "blackjack":
+        outcomes = blackjack_outcomes(
+            rounds, amount, options["decks"], options["penetration"], options["stand_on"]
+        )
+    else:
+        outcomes = uniform_outcomes(rounds, len(nets))
+
+    counts = [outcomes.count(code) for code in range(len(nets))]
+
+    # Split the rounds into sessions that each start from the same bankroll;
+    # a session is ruined once the balance can no longer cover a bet
+    session_rounds = options["session_rounds"]
+    sessions = 0
+    ruined = 0
+    for start in range(0, rounds - session_rounds + 1, session_rounds):
+        balances = accumulate(map(nets.__getitem__, outcomes[start:start + session_rounds]), initial=options["bankroll"])
+        sessions += 1
+        ruined += min(balances) < amount
+    return counts, sessions, ruined
+
+
+def simulate(games: List[str], rounds: int, options: Dict, workers: int, seed: int) -> Dict[str, Dict]:
+    """Run every game over the process pool and summarise each one"""
+    tasks = []
+    for game in games:
+        for start in range(0, rounds, CHUNK_SIZE):
+            tasks.append((game, min(CHUNK_SIZE, rounds - start), seed + len(tasks), options))
+
+    totals = {game: {"counts": None, "sessions": 0, "ruined": 0} for game in games}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(task[0], pool.submit(simulate_chunk, *task)) for task in tasks]
+        for game, future in futures:
+            counts, sessions, ruined = future.result()
+            total = totals[game]
+            total["counts"] = counts if total["counts"] is None else [a + b for a, b in zip(total["counts"], counts)]
+            total["sessions"] += sessions
+            total["ruined"] += ruined
+
+    results = {}
+    for game, total in totals.items():
+        nets = outcome_nets(game, options["amount"])
+        played = sum(total["counts"])
+        mean = sum(count * net for count, net in zip(total["counts"], nets)) / played
+        variance = sum(count * (net - mean) ** 2 for count, net in zip(total["counts"], nets)) / played
+        results[game] = {
+            "rounds": played,
+            "expected_value": mean,
+            "house_edge": -mean / options["amount"],
+            "variance": variance,
+            "margin": 1.96 * (variance / played) ** 0.5,
+            "ruin": total["ruined"] / total["sessions"] if total["sessions"] else None
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the games' payouts")
+    parser.add_argument("--rounds", type=int, default=10_000_000, help="rounds per game")
+    parser.add_argument("--games", nargs="+", choices=GAMES, default=GAMES)
+    parser.add_argument("--amount", type=int, default=100, help="points bet each round")
+    parser.add_argument("--bankroll", type=int, default=10_000, help="points each session starts with")
+    parser.add_argument("--session-rounds", type=int, default=1_000, help="rounds per session when measuring ruin")
+    parser.add_argument("--decks", type=int, default=6, help="decks in the blackjack shoe")
+    parser.add_argument("--penetration", type=float, default=0.75, help="where the blackjack cut card sits")
+    parser.add_argument("--stand-on", type=int, default=17, help="the simulated blackjack player hits below this")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--seed", type=int, default=None, help="seed, for repeatable runs")
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else secrets.randbits(32)
+    options = {
+        "amount": args.amount,
+        "bankroll": args.bankroll,
+        "session_rounds": args.session_rounds,
+        "decks": args.decks,
+        "penetration": args.penetration,
+        "stand_on": args.stand_on
+    }
+
+    started = time.perf_counter()
+    results = simulate(args.games, args.rounds, options, args.workers, seed)
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.rounds:,} rounds per game, {args.amount:,} point bets, seed {seed}, {elapsed:.1f}s on {args.workers} workers")
+    print(f"Ruin: a {args.bankroll:,} point bankroll can't cover a bet within {args.session_rounds:,} rounds\n")
+    print(f"{'game':<10} {'EV/round':>10} {'house edge':>11} {'±95%':>8} {'std dev':>9} {'ruin':>7}")
+    for game, result in results.items():
+        ruin = f"{result['ruin']:.1%}" if result["ruin"] is not None else "-"
+        print(
+            f"{game:<10} {result['expected_value']:>+10.3f} {result['house_edge']:>+11.3%} "
+            f"{result['margin'] / args.amount:>8.3%} {result['variance'] ** 0.5:>9.1f} {ruin:>7}"
+        )
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+import types
+
+# The bot reads its settings from an untracked config.py; tests get a stub
+# pointing at a throwaway database, installed before anything imports it
+config = types.ModuleType("config")
+config.BOT_TOKEN = ""
+config.DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="gman-tests-"), "database.db")
+config.DATABASE_COMMIT_WINDOW = 0.001
+config.RNG_LOG = False
+sys.modules["config"] = config
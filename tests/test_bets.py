@@ -0,0 +1,127 @@
+import asyncio
+import random
+import sqlite3
+
+import config
+from functions import database
+from functions.database import (
+    get_user_stats,
+    refund_bet,
+    reserve_bet,
+    set_balance,
+    settle_bet,
+    settle_session,
+    transfer_points
+)
+
+PARALLEL_BETS = 5000
+
+
+def run(coroutine):
+    async def with_tables():
+        await database.setup_tables()
+        return await coroutine
+    return asyncio.run(with_tables())
+
+
+def stored_row(user_id: int):
+    """The user's row as committed, bypassing the cache"""
+    connection = sqlite3.connect(config.DATABASE_PATH)
+    try:
+        return connection.execute(
+            "SELECT points, wins, losses, draws, total_games FROM users WHERE id = ?", (user_id,)
+        ).fetchone()
+    finally:
+        connection.close()
+
+
+def ledger_total(user_id: int) -> int:
+    connection = sqlite3.connect(config.DATABASE_PATH)
+    try:
+        return connection.execute("SELECT COALESCE(SUM(delta), 0) FROM ledger WHERE user_id = ?", (user_id,)).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_parallel_reservations_never_overdraw():
+    user_id = 1001
+
+    async def scenario():
+        await set_balance(user_id, 1000)
+        return await asyncio.gather(*(reserve_bet(user_id, 7) for _ in range(PARALLEL_BETS)))
+
+    held = [balance for balance in run(scenario()) if balance is not None]
+    assert len(held) == 1000 // 7
+    assert min(held) == 1000 % 7
+    assert stored_row(user_id)[0] == 1000 % 7
+    assert ledger_total(user_id) == 1000 % 7
+
+
+def test_parallel_bets_settle_to_the_expected_balance():
+    user_id = 1002
+    rng = random.Random(6)
+    # Loss, push or win for every bet, decided up front so the expected balance is known
+    payouts = [rng.choice([0, 10, 20]) for _ in range(PARALLEL_BETS)]
+
+    async def bet(payout: int):
+        if await reserve_bet(user_id, 10) is None:
+            return None
+        await asyncio.sleep(0)
+        await settle_bet(user_id, payout, 10)
+        return payout
+
+    async def scenario():
+        await set_balance(user_id, 20_000)
+        results = await asyncio.gather(*(bet(payout) for payout in payouts))
+        return results, await get_user_stats(user_id)
+
+    results, stats = run(scenario())
+    placed = [payout for payout in results if payout is not None]
+    expected = 20_000 + sum(payout - 10 for payout in placed)
+    assert stats["points"] == expected
+    assert stored_row(user_id) == (
+        expected,
+        placed.count(20),
+        placed.count(0),
+        placed.count(10),
+        len(placed)
+    )
+    assert ledger_total(user_id) == expected
+
+
+def test_refunds_and_batched_settlements_balance_out():
+    user_ids = list(range(2000, 2050))
+
+    async def scenario():
+        for user_id in user_ids:
+            await set_balance(user_id, 100)
+        holds = await asyncio.gather(*(reserve_bet(user_id, 60) for user_id in user_ids * 2))
+        # Only the first hold per user fits; refund half the rounds and settle the rest as wins
+        refunds = [refund_bet(user_id, 60) for user_id in user_ids[:25]]
+        await asyncio.gather(settle_session([(user_id, 120, 60) for user_id in user_ids[25:]], "roulette", 0), *refunds)
+        return holds
+
+    holds = run(scenario())
+    assert sum(balance is not None for balance in holds) == len(user_ids)
+    for user_id in user_ids[:25]:
+        assert stored_row(user_id) == (100, 0, 0, 0, 0)
+    for user_id in user_ids[25:]:
+        assert stored_row(user_id) == (160, 1, 0, 0, 1)
+
+
+def test_parallel_transfers_conserve_points():
+    first, second = 3001, 3002
+
+    async def scenario():
+        await set_balance(first, 500)
+        await set_balance(second, 500)
+        transfers = [transfer_points(first, second, 3) for _ in range(PARALLEL_BETS // 2)]
+        transfers += [transfer_points(second, first, 5) for _ in range(PARALLEL_BETS // 2)]
+        return await asyncio.gather(*transfers)
+
+    run(scenario())
+    first_points, second_points = stored_row(first)[0], stored_row(second)[0]
+    assert first_points >= 0 and second_points >= 0
+    assert first_points + second_points == 1000
+    assert ledger_total(first) == first_points
+    assert ledger_total(second) == second_points
@@ -0,0 +1,101 @@
+import asyncio
+import random
+import sqlite3
+
+import config
+from functions import database
+from functions.cards import Shoe, add_card, hand_value
+from functions.database import (
+    get_game_sessions,
+    reserve_bet_entry,
+    save_game_session_entry,
+    set_balance,
+    settle_bet_entry
+)
+from functions.rules import blackjack_payout, play_dealer
+
+PLAYERS = 500
+CHANNEL_ID = 45
+
+
+def run(coroutine):
+    async def with_tables():
+        await database.setup_tables()
+        return await coroutine
+    return asyncio.run(with_tables())
+
+
+def stored_row(user_id: int):
+    """The user's row as committed, bypassing the cache"""
+    connection = sqlite3.connect(config.DATABASE_PATH)
+    try:
+        return connection.execute(
+            "SELECT points, wins, losses, draws, total_games FROM users WHERE id = ?", (user_id,)
+        ).fetchone()
+    finally:
+        connection.close()
+
+
+def ledger_total(user_id: int) -> int:
+    connection = sqlite3.connect(config.DATABASE_PATH)
+    try:
+        return connection.execute("SELECT COALESCE(SUM(delta), 0) FROM ledger WHERE user_id = ?", (user_id,)).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_a_full_table_of_hits_and_stands_settles_every_hand():
+    user_ids = list(range(5001, 5001 + PLAYERS))
+    shoe = Shoe(decks=6)
+    rng = random.Random(10)
+    # How long each player keeps hitting, decided up front
+    stand_on = {user_id: rng.randint(12, 18) for user_id in user_ids}
+
+    async def seat(user_id: int) -> dict:
+        hand = {
+            "player_id": user_id,
+            "amount": 100,
+            "player_hand": [shoe.draw(), shoe.draw()],
+            "dealer_hand": [shoe.draw(), shoe.draw()]
+        }
+        assert await reserve_bet_entry(user_id, 100, "blackjack", CHANNEL_ID, hand) == 900
+        return hand
+
+    async def play(hand: dict):
+        user_id, player_hand, dealer_hand = hand["player_id"], hand["player_hand"], hand["dealer_hand"]
+        # Every hit saves the hand, as BlackjackView.hit does, while the rest of the table plays
+        score = add_card(add_card(0, player_hand[0]), player_hand[1])
+        while hand_value(score) < stand_on[user_id]:
+            card = shoe.draw()
+            player_hand.append(card)
+            score = add_card(score, card)
+            await save_game_session_entry("blackjack", CHANNEL_ID, user_id, hand)
+
+        player_value = hand_value(score)
+        dealer_value = player_value
+        if player_value <= 21:
+            dealer_value = hand_value(play_dealer(shoe, dealer_hand, add_card(add_card(0, dealer_hand[0]), dealer_hand[1])))
+        payout = blackjack_payout(100, player_value, dealer_value)
+        return payout, await settle_bet_entry(user_id, payout, 100, "blackjack", CHANNEL_ID)
+
+    async def scenario():
+        for user_id in user_ids:
+            await set_balance(user_id, 1000)
+        hands = await asyncio.gather(*(seat(user_id) for user_id in user_ids))
+        held = (await get_game_sessions("blackjack"))[CHANNEL_ID][1]
+        results = await asyncio.gather(*(play(hand) for hand in hands))
+        return held, results, await get_game_sessions("blackjack")
+
+    held, results, sessions = run(scenario())
+    assert sorted(held) == user_ids
+    assert CHANNEL_ID not in sessions
+    for user_id, (payout, balance) in zip(user_ids, results):
+        assert balance == 900 + payout
+        assert stored_row(user_id) == (
+            balance,
+            int(payout == 200),
+            int(payout == 0),
+            int(payout == 100),
+            1
+        )
+        assert ledger_total(user_id) == balance
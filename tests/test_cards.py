@@ -0,0 +1,74 @@
+import random
+from typing import List
+
+from functions.cards import ACE, DECK, Shoe
+
+
+def test_undraw_puts_an_untouched_deal_back():
+    shoe = Shoe(2, shuffle=random.Random(3).shuffle)
+    top = bytes(shoe.cards[:4])
+    [shoe.draw() for _ in range(4)]
+    assert shoe.undraw(shoe.mark(), 4)
+    assert bytes(shoe.draw() for _ in range(4)) == top
+
+
+def test_undraw_leaves_the_shoe_alone_once_the_table_moved_on():
+    shoe = Shoe(2, shuffle=random.Random(4).shuffle)
+    [shoe.draw() for _ in range(4)]
+    dealt = shoe.mark()
+    shoe.draw()
+    assert not shoe.undraw(dealt, 4)
+    assert shoe.position == 5
+
+    [shoe.draw() for _ in range(4)]
+    dealt = shoe.mark()
+    shoe.reshuffle()
+    [shoe.draw() for _ in range(9)]
+    assert not shoe.undraw(dealt, 4)
+    assert shoe.position == 9
+
+
+# Chi-square critical value for 51 degrees of freedom (52 outcomes) at p = 0.001;
+# the shuffles are seeded, so a pass or a fail is the same on every run
+CRITICAL_VALUE = 86.66
+
+
+def chi_square(counts: List[int]) -> float:
+    expected = sum(counts) / len(counts)
+    return sum((count - expected) ** 2 / expected for count in counts)
+
+
+def deal(shoe: Shoe, cards: int) -> List[int]:
+    """Deal the way a table does: a fresh shuffle once the cut card is out, the spare topped up between hands"""
+    counts = [0] * len(DECK)
+    for _ in range(cards // 4):
+        if shoe.past_cut_card:
+            shoe.reshuffle()
+        if shoe.needs_spare:
+            shoe.shuffle_spare()
+        for _ in range(4):
+            counts[shoe.draw()] += 1
+    return counts
+
+
+def test_dealt_cards_are_uniform():
+    assert chi_square(deal(Shoe(6, shuffle=random.Random(16).shuffle), 520_000)) < CRITICAL_VALUE
+    assert chi_square(deal(Shoe(6, preshuffle=True, shuffle=random.Random(17).shuffle), 520_000)) < CRITICAL_VALUE
+
+
+def test_every_position_in_a_fresh_shoe_is_uniform():
+    shoe = Shoe(1, preshuffle=True, shuffle=random.Random(18).shuffle)
+    # Where the ace of spades lands, and whether consecutive shoes open with the same card
+    positions = [0] * len(DECK)
+    repeats = 0
+    first = shoe.cards[0]
+    for _ in range(52_000):
+        shoe.reshuffle()
+        shoe.shuffle_spare()
+        positions[shoe.cards.index(ACE)] += 1
+        repeats += shoe.cards[0] == first
+        first = shoe.cards[0]
+
+    assert chi_square(positions) < CRITICAL_VALUE
+    # 1000 expected; a spare swapped in without its shuffle brings back an earlier order
+    assert 880 < repeats < 1120
@@ -0,0 +1,90 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLUSTERS = 4
+ROUNDS = 300
+
+# One cluster process: a stub config pointing at the shared database, then
+# bets and transfers on the same few users as every other process
+WORKER = textwrap.dedent("""
+    import asyncio, json, sys, types
+
+    config = types.ModuleType("config")
+    config.BOT_TOKEN = ""
+    config.DATABASE_PATH = sys.argv[1]
+    config.DATABASE_COMMIT_WINDOW = 0.001
+    sys.modules["config"] = config
+
+    from functions import database
+
+    async def main(cluster_id, rounds):
+        database.set_cluster(cluster_id)
+        held = 0
+        for round in range(rounds):
+            if await database.reserve_bet(3, 3) is not None:
+                held += 1
+            if round % 2:
+                await database.transfer_points(1, 2, 7)
+            else:
+                await database.transfer_points(2, 1, 5)
+            await database.add_balance(4, 1)
+        return held
+
+    held = asyncio.run(main(int(sys.argv[2]), int(sys.argv[3])))
+    database.close_connections()
+    print(json.dumps(held))
+""")
+
+
+def test_clusters_lose_no_updates():
+    path = os.path.join(tempfile.mkdtemp(prefix="gman-clusters-"), "database.db")
+    setup = textwrap.dedent("""
+        import asyncio, sys, types
+        config = types.ModuleType("config")
+        config.BOT_TOKEN = ""
+        config.DATABASE_PATH = sys.argv[1]
+        sys.modules["config"] = config
+        from functions import database
+
+        async def main():
+            await database.setup_tables()
+            for user_id, points in ((1, 500), (2, 500), (3, 1000), (4, 0)):
+                await database.set_balance(user_id, points)
+
+        asyncio.run(main())
+        database.close_connections()
+    """)
+    subprocess.run([sys.executable, "-c", setup, path], cwd=ROOT, check=True)
+
+    workers = [
+        subprocess.Popen([sys.executable, "-c", WORKER, path, str(cluster_id), str(ROUNDS)], cwd=ROOT, stdout=subprocess.PIPE, text=True)
+        for cluster_id in range(CLUSTERS)
+    ]
+    held = []
+    for worker in workers:
+        output, _ = worker.communicate(timeout=300)
+        assert worker.returncode == 0
+        held.append(json.loads(output.strip().splitlines()[-1]))
+
+    connection = sqlite3.connect(path)
+    try:
+        points = dict(connection.execute("SELECT id, points FROM users"))
+        ledger = dict(connection.execute("SELECT user_id, SUM(delta) FROM ledger GROUP BY user_id"))
+    finally:
+        connection.close()
+
+    # Transfers move points around without creating or losing any
+    assert points[1] + points[2] == 1000
+    assert min(points[1], points[2]) >= 0
+    # Holds from every process together can't take more than the balance
+    assert sum(held) == 1000 // 3
+    assert points[3] == 1000 % 3
+    # Every unconditional increment from every process landed
+    assert points[4] == CLUSTERS * ROUNDS
+    assert ledger == points
@@ -0,0 +1,58 @@
+import calendar
+import os
+import sqlite3
+import tempfile
+
+from functions import database
+
+
+def utc(year: int, month: int, day: int) -> int:
+    return calendar.timegm((year, month, day, 12, 0, 0))
+
+
+def test_archive_months_cover_every_row_once():
+    months = database._archive_months(utc(2023, 11, 20), utc(2024, 2, 3))
+    assert [month for month, _, _ in months] == ["2023-11", "2023-12", "2024-01", "2024-02"]
+    assert months[0][1] < 0 and months[-1][2] == (1 << 63) - 1
+    for (_, _, end), (_, start, _) in zip(months, months[1:]):
+        assert end == start
+    assert months[2][1] == calendar.timegm((2024, 1, 1, 0, 0, 0))
+
+
+def test_a_catch_up_rotation_splits_rows_by_month(monkeypatch):
+    directory = tempfile.mkdtemp(prefix="gman-ledger-")
+    hot = os.path.join(directory, "hot.db")
+    monkeypatch.setattr(database, "DATABASE_PATH", hot)
+    monkeypatch.setattr(database, "LEDGER_ARCHIVE_PATH", os.path.join(directory, "ledger-{month}.db"))
+
+    connection = sqlite3.connect(hot)
+    database._setup_ledger_tables(connection.cursor())
+    times = [utc(2024, 1, 5), utc(2024, 1, 31), utc(2024, 2, 1), utc(2024, 3, 9), utc(2024, 3, 10)]
+    connection.executemany(
+        "INSERT INTO ledger (id, user_id, kind, delta, time, ref) VALUES (?, 1, 1, 10, ?, NULL)",
+        enumerate(times, start=1)
+    )
+    connection.executemany(
+        "INSERT INTO balance_snapshots (user_id, ledger_id, time, balance) VALUES (1, ?, ?, ?)",
+        [(1, times[0], 10), (3, times[2], 30), (5, times[4], 50)]
+    )
+    connection.commit()
+    connection.close()
+
+    months = database._archive_months(times[0], times[-1])
+    superseded = database._archive_ledger(months, 1, 5)
+
+    assert sorted(superseded) == [(1, 1), (1, 3)]
+    archived = {}
+    for month, _, _ in months:
+        archive = sqlite3.connect(os.path.join(directory, f"ledger-{month}.db"))
+        archived[month] = (
+            [row[0] for row in archive.execute("SELECT id FROM ledger ORDER BY id")],
+            [row[0] for row in archive.execute("SELECT ledger_id FROM balance_snapshots ORDER BY ledger_id")]
+        )
+        archive.close()
+    assert archived == {
+        "2024-01": ([1, 2], [1]),
+        "2024-02": ([3], [3]),
+        "2024-03": ([4, 5], [])
+    }
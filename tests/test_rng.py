@@ -0,0 +1,35 @@
+import re
+
+import pytest
+
+from functions.rng import RandomService
+from functions.rules import spin_roulette
+
+
+def logged_seed(output: str) -> int:
+    """The seed of the last round RandomService printed"""
+    return int(re.findall(r"seed ([0-9a-f]+)", output)[-1], 16)
+
+
+@pytest.mark.parametrize("master_seed", [None, 1234], ids=["os-seeded", "master-seeded"])
+def test_replaying_a_logged_seed_repeats_the_round(master_seed, capsys):
+    service = RandomService(master_seed)
+    for round in range(200):
+        rng = service.round("roulette", round)
+        result = spin_roulette(rng)
+        cards = list(range(52 * 6))
+        rng.shuffle(cards)
+
+        replay = RandomService.replay(logged_seed(capsys.readouterr().out))
+        assert spin_roulette(replay) == result
+        replayed_cards = list(range(52 * 6))
+        replay.shuffle(replayed_cards)
+        assert replayed_cards == cards
+
+
+def test_a_master_seed_reproduces_the_whole_run():
+    first, second = RandomService(99, log=False), RandomService(99, log=False)
+    for round in range(50):
+        for game in ("roulette", "blackjack"):
+            assert first.round(game).seed == second.round(game).seed
+    assert RandomService(100, log=False).round("roulette").seed != RandomService(99, log=False).round("roulette").seed
@@ -0,0 +1,138 @@
+import asyncio
+import random
+import sqlite3
+
+import config
+from functions import database
+from functions.database import (
+    get_game_sessions,
+    refund_bet_entry,
+    reserve_bet_entry,
+    save_game_session,
+    set_balance,
+    settle_session
+)
+
+CLICKS_PER_PLAYER = 20
+AMOUNT = 50
+
+
+def run(coroutine):
+    async def with_tables():
+        await database.setup_tables()
+        return await coroutine
+    return asyncio.run(with_tables())
+
+
+def stored_row(user_id: int):
+    """The user's row as committed, bypassing the cache"""
+    connection = sqlite3.connect(config.DATABASE_PATH)
+    try:
+        return connection.execute(
+            "SELECT points, wins, losses, draws, total_games FROM users WHERE id = ?", (user_id,)
+        ).fetchone()
+    finally:
+        connection.close()
+
+
+def ledger_total(user_id: int) -> int:
+    connection = sqlite3.connect(config.DATABASE_PATH)
+    try:
+        return connection.execute("SELECT COALESCE(SUM(delta), 0) FROM ledger WHERE user_id = ?", (user_id,)).fetchone()[0]
+    finally:
+        connection.close()
+
+
+class Table:
+    """The round and join guard a channel's RouletteView works with, without the replies"""
+
+    def __init__(self, channel_id: int):
+        self.channel_id = channel_id
+        self.games = {}
+        self.joins = set()
+
+    async def join(self, user_id: int) -> str:
+        game = self.games.get(self.channel_id)
+        if not game:
+            return "ended"
+
+        join = (self.channel_id, user_id)
+        if user_id in game["bets"] or join in self.joins:
+            return "already joined"
+
+        bet = {"user_id": user_id, "color": "red", "amount": AMOUNT}
+        self.joins.add(join)
+        try:
+            if await reserve_bet_entry(user_id, AMOUNT, "roulette", self.channel_id, bet) is None:
+                return "insufficient"
+            if self.games.get(self.channel_id) is not game:
+                await refund_bet_entry(user_id, AMOUNT, "roulette", self.channel_id)
+                return "ended"
+            game["bets"][user_id] = bet
+            return "joined"
+        finally:
+            self.joins.discard(join)
+
+    async def finish(self):
+        """Settle the round as a loss for everyone, as _finish_roulette does on a spin nobody called"""
+        game = self.games.pop(self.channel_id)
+        await settle_session([(user_id, 0, bet["amount"]) for user_id, bet in game["bets"].items()], "roulette", self.channel_id)
+
+
+def clicks(user_ids):
+    """Every player's clicks, shuffled together as they'd arrive"""
+    order = user_ids * CLICKS_PER_PLAYER
+    random.Random(user_ids[0]).shuffle(order)
+    return order
+
+
+def test_repeat_join_clicks_hold_one_bet_each():
+    table = Table(46)
+    user_ids = list(range(6001, 6201))
+
+    async def scenario():
+        for user_id in user_ids:
+            await set_balance(user_id, 1000)
+        await save_game_session("roulette", table.channel_id, {"message_id": 1})
+        table.games[table.channel_id] = {"bets": {}}
+        results = await asyncio.gather(*(table.join(user_id) for user_id in clicks(user_ids)))
+        return results, (await get_game_sessions("roulette"))[table.channel_id][1]
+
+    results, entries = run(scenario())
+    assert results.count("joined") == len(user_ids)
+    assert results.count("already joined") == len(user_ids) * (CLICKS_PER_PLAYER - 1)
+    assert sorted(entries) == sorted(table.games[table.channel_id]["bets"]) == user_ids
+    for user_id in user_ids:
+        assert stored_row(user_id)[0] == 1000 - AMOUNT
+        assert ledger_total(user_id) == 1000 - AMOUNT
+
+
+def test_clicks_racing_the_spin_are_settled_or_refunded():
+    table = Table(47)
+    user_ids = list(range(6201, 6401))
+    early, late = user_ids[:100], user_ids[100:]
+
+    async def scenario():
+        for user_id in user_ids:
+            await set_balance(user_id, 1000)
+        await save_game_session("roulette", table.channel_id, {"message_id": 1})
+        game = {"bets": {}}
+        table.games[table.channel_id] = game
+        await asyncio.gather(*(table.join(user_id) for user_id in clicks(early)))
+
+        # The late holds are queued by the time the round settles, so they're written first
+        racing = [asyncio.create_task(table.join(user_id)) for user_id in clicks(late)]
+        await asyncio.sleep(0)
+        await table.finish()
+        return game["bets"], await asyncio.gather(*racing), await get_game_sessions("roulette")
+
+    settled, results, sessions = run(scenario())
+    assert sorted(settled) == early
+    assert results.count("ended") == len(late)
+    assert table.channel_id not in sessions
+    for user_id in early:
+        assert stored_row(user_id) == (1000 - AMOUNT, 0, 1, 0, 1)
+        assert ledger_total(user_id) == 1000 - AMOUNT
+    for user_id in late:
+        assert stored_row(user_id) == (1000, 0, 0, 0, 0)
+        assert ledger_total(user_id) == 1000
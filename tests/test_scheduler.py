@@ -0,0 +1,91 @@
+import asyncio
+import json
+import sqlite3
+import time
+import tracemalloc
+
+import config
+from functions import database, scheduler
+from functions.scheduler import Scheduler
+
+
+def run(coroutine):
+    async def with_tables():
+        await database.setup_tables()
+        return await coroutine
+    return asyncio.run(with_tables())
+
+
+def pending_events(kind: str) -> int:
+    connection = sqlite3.connect(config.DATABASE_PATH)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM scheduled_events WHERE kind = ?", (kind,)).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_a_failed_event_is_kept_and_retried(monkeypatch):
+    monkeypatch.setattr(scheduler, "RETRY_DELAY", 0.05)
+    calls = []
+
+    async def scenario():
+        done = asyncio.Event()
+
+        async def flaky(payload: dict):
+            calls.append(payload)
+            if len(calls) == 1:
+                raise RuntimeError("settlement failed")
+            done.set()
+
+        timers = Scheduler({"retry_test": flaky})
+        await timers.start()
+        await timers.schedule("retry_test", 0, {"channel_id": 50})
+        await asyncio.sleep(0.02)
+        # The first attempt failed, so the row is still there for a restart
+        kept = pending_events("retry_test")
+        await asyncio.wait_for(done.wait(), timeout=5)
+        await asyncio.gather(*timers.running)
+        timers.stop()
+        return kept
+
+    assert run(scenario()) == 1
+    assert calls == [{"channel_id": 50}, {"channel_id": 50}]
+    assert pending_events("retry_test") == 0
+
+
+def test_a_hundred_thousand_timers_share_one_task():
+    latencies = []
+
+    async def scenario():
+        async def record(payload: dict):
+            latencies.append(time.time() - payload["due"])
+
+        timers = Scheduler({"load_test": record})
+        await timers.start()
+
+        # Far-off pots go straight on the heap; only their memory is of interest
+        tracemalloc.start()
+        later = time.time() + 3600
+        for index in range(100_000):
+            timers._push(later + index, -1 - index, "load_test", json.dumps({"due": later + index, "channel_id": index}))
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await asyncio.sleep(0.01)
+        # The test, the scheduler and its timed wait; no coroutine per timer
+        tasks = len(asyncio.all_tasks())
+
+        # Events due now still wake up on time behind all of them
+        now = time.time()
+        for index in range(20):
+            due = now + 0.05 + index * 0.01
+            await timers.schedule("load_test", due, {"due": due})
+        while len(latencies) < 20:
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*timers.running)
+        timers.stop()
+        return tasks, size
+
+    tasks, size = run(scenario())
+    assert tasks <= 3
+    assert size / 100_000 < 400  # bytes per pending timer
+    assert max(latencies) < 0.25
@@ -0,0 +1,107 @@
+import asyncio
+import sqlite3
+
+import config
+from functions import database
+from functions.database import (
+    get_game_sessions,
+    refund_bet_entry,
+    refund_contribution,
+    refund_session,
+    reserve_bet_entry,
+    reserve_contribution,
+    save_game_session,
+    set_balance,
+    settle_bet_entry,
+    settle_session
+)
+
+
+def run(coroutine):
+    async def with_tables():
+        await database.setup_tables()
+        return await coroutine
+    return asyncio.run(with_tables())
+
+
+def points(user_id: int) -> int:
+    connection = sqlite3.connect(config.DATABASE_PATH)
+    try:
+        return connection.execute("SELECT points FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_a_failed_hold_saves_no_entry():
+    async def scenario():
+        await set_balance(4001, 10)
+        balance = await reserve_bet_entry(4001, 50, "roulette", 40, {"user_id": 4001, "color": "red", "amount": 50})
+        return balance, await get_game_sessions("roulette")
+
+    balance, sessions = run(scenario())
+    assert balance is None
+    assert 40 not in sessions
+
+
+def test_a_round_settles_and_closes_together():
+    bet = {"user_id": 4002, "color": "black", "amount": 30}
+
+    async def scenario():
+        await set_balance(4002, 100)
+        await save_game_session("roulette", 41, {"message_id": 1})
+        assert await reserve_bet_entry(4002, 30, "roulette", 41, bet) == 70
+        held = (await get_game_sessions("roulette"))[41]
+        balances = await settle_session([(4002, 60, 30)], "roulette", 41)
+        return held, balances, await get_game_sessions("roulette")
+
+    held, balances, sessions = run(scenario())
+    assert held == ({"message_id": 1}, {4002: bet})
+    assert balances == {4002: 130}
+    assert 41 not in sessions
+
+
+def test_contributions_add_up_and_refunds_take_them_back():
+    async def scenario():
+        await set_balance(4003, 100)
+        await asyncio.gather(*(reserve_contribution(4003, 10, "jackpot", 42) for _ in range(5)))
+        added = (await get_game_sessions("jackpot"))[42][1]
+        await refund_contribution(4003, 10, "jackpot", 42)
+        refunded = (await get_game_sessions("jackpot"))[42][1]
+        for _ in range(4):
+            await refund_contribution(4003, 10, "jackpot", 42)
+        return added, refunded, await get_game_sessions("jackpot")
+
+    added, refunded, sessions = run(scenario())
+    assert added == {4003: 50}
+    assert refunded == {4003: 40}
+    assert 42 not in sessions
+    assert points(4003) == 100
+
+
+def test_a_hand_settles_and_leaves_the_session_together():
+    async def scenario():
+        await set_balance(4004, 100)
+        await set_balance(4005, 100)
+        await reserve_bet_entry(4004, 20, "blackjack", 43, {"player_id": 4004})
+        await reserve_bet_entry(4005, 20, "blackjack", 43, {"player_id": 4005})
+        won = await settle_bet_entry(4004, 40, 20, "blackjack", 43)
+        refunded = await refund_bet_entry(4005, 20, "blackjack", 43)
+        return won, refunded, await get_game_sessions("blackjack")
+
+    won, refunded, sessions = run(scenario())
+    assert (won, refunded) == (120, 100)
+    assert 43 not in sessions
+
+
+def test_a_game_that_never_started_hands_everything_back():
+    async def scenario():
+        await set_balance(4006, 100)
+        await set_balance(4007, 100)
+        await reserve_contribution(4006, 25, "jackpot", 44)
+        await reserve_contribution(4007, 15, "jackpot", 44)
+        balances = await refund_session([(4006, 25), (4007, 15)], "jackpot", 44)
+        return balances, await get_game_sessions("jackpot")
+
+    balances, sessions = run(scenario())
+    assert balances == {4006: 100, 4007: 100}
+    assert 44 not in sessions